@@ -0,0 +1,66 @@
+"""
+Microbenchmark: `BaseAuthorizationBackend.has_module_perms()` with and without the module index.
+
+Run from the repository root::
+
+    PYTHONPATH=src python benchmarks/module_perms.py
+"""
+from __future__ import print_function
+
+import timeit
+
+from auth_utils.backends import BaseAuthorizationBackend
+
+APPS = 50
+PERMS_PER_APP = 100
+
+
+class User(object):
+    is_active = True
+
+
+class LargeBackend(BaseAuthorizationBackend):
+
+    def get_user_permissions(self, user_obj, obj=None):
+        return {'app{}.perm{}'.format(app, i) for app in range(APPS) for i in range(PERMS_PER_APP)}
+
+
+class CachedScanBackend(LargeBackend):
+    """
+    Cached permissions, but scanned on every call, as before the module index.
+    """
+    cache_permissions = True
+
+    def has_module_perms(self, user_obj, app_label):
+        for perm in self.get_all_permissions(user_obj):
+            if perm[:perm.index('.')] == app_label:
+                return True
+        return False
+
+
+class CachedLargeBackend(LargeBackend):
+    cache_permissions = True
+
+
+def bench(backend_class, number=10):
+    backend = backend_class()
+    user = User()
+    app_labels = ['app{}'.format(app) for app in range(APPS)] + ['missing']
+
+    def admin_index():
+        for app_label in app_labels:
+            backend.has_module_perms(user, app_label)
+
+    admin_index()  # Warm the cache, if any.
+    return min(timeit.repeat(admin_index, number=number, repeat=3)) / number
+
+
+def main():
+    print('{} apps x {} perms, {} has_module_perms() calls per iteration'.format(
+        APPS, PERMS_PER_APP, APPS + 1))
+    for backend_class in [LargeBackend, CachedScanBackend, CachedLargeBackend]:
+        print('{:20} {:10.3f} ms'.format(backend_class.__name__, bench(backend_class) * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""
+Microbenchmark: time and memory allocated per application of the `perms` template filter.
+
+This compares the `perms` filter's slotted `PermChecker` with the previous checker, which
+had a ``__dict__``, and with a pool of checkers per user and object, in two cases: a table
+with a different object per row, where the pool can't reuse checkers (and keeps them, and
+their objects, alive), and repeated checks of the same object, where it can. Run from the
+repository root::
+
+    PYTHONPATH=src python benchmarks/perm_checker.py
+"""
+from __future__ import print_function
+
+import timeit
+import tracemalloc
+
+import django
+from django.conf import settings
+
+settings.configure(
+    INSTALLED_APPS=['django.contrib.auth', 'django.contrib.contenttypes'],
+    AUTHENTICATION_BACKENDS=[],
+)
+django.setup()
+
+from auth_utils.cache import get_object_key  # noqa: E402
+from auth_utils.templatetags.auth_utils import PermChecker, perms  # noqa: E402
+
+ROWS = 1000
+
+
+class User(object):
+    is_active = True
+
+    def has_perm(self, perm, obj=None):
+        return True
+
+
+class Row(object):
+
+    def __init__(self, pk):
+        self.pk = pk
+
+
+class DictPermChecker(object):
+    """
+    The previous checker: an instance with a ``__dict__``.
+    """
+    __contains__ = PermChecker.__contains__
+
+    def __init__(self, user, obj):
+        self.user = user
+        self.obj = obj
+
+
+def dict_perms(user, obj=None):
+    return DictPermChecker(user, obj)
+
+
+def pooled_perms(user, obj=None):
+    """
+    Reuse one checker per user and object, kept on the user.
+    """
+    checkers = user.__dict__.setdefault('checkers', {})
+    key = get_object_key(obj)
+    try:
+        return checkers[key]
+    except KeyError:
+        checker = checkers[key] = PermChecker(user, obj)
+        return checker
+
+
+def bench(perms_filter, rows, number=10):
+    """
+    Return the time per application of ``perms_filter`` to ``rows``, and the bytes it allocates.
+
+    Each render starts with a new user, as in a new request: the checker pool and the
+    memoized permission results start empty.
+    """
+    def render():
+        user = User()
+        for row in rows:
+            'news.change_article' in perms_filter(user, row)
+
+    render()  # Warm up.
+    seconds = min(timeit.repeat(render, number=number, repeat=3)) / number / len(rows)
+
+    # Keep the checkers alive, to measure their allocations.
+    user = User()
+    kept = [None] * len(rows)
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for (i, row) in enumerate(rows):
+        kept[i] = perms_filter(user, row)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    allocated = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    return (seconds, allocated / float(len(rows)))
+
+
+def main():
+    same = Row(0)
+    for (case, rows) in [('a different object per row', [Row(pk) for pk in range(ROWS)]),
+                         ('the same object on every row', [same] * ROWS)]:
+        print('{} rows, one perms filter application per row, {}'.format(ROWS, case))
+        for (name, perms_filter) in [('dict, per use', dict_perms),
+                                     ('slotted, per use', perms),
+                                     ('slotted, pooled', pooled_perms)]:
+            (seconds, allocated) = bench(perms_filter, rows)
+            print('  {:18} {:8.3f} us {:8.1f} bytes allocated per application'.format(
+                name, seconds * 1000000, allocated))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,271 @@
+"""
+Benchmark suite: backends, template filters and view mixins, against an in-memory SQLite database.
+
+Run from the repository root::
+
+    PYTHONPATH=src python benchmarks/suite.py
+    PYTHONPATH=src python benchmarks/suite.py --save before.json
+    PYTHONPATH=src python benchmarks/suite.py --compare before.json
+
+Each benchmark reports its best time per iteration, and the number of database queries
+per iteration. ``--compare`` exits with status 1 if any benchmark got slower by more than
+``--tolerance``, or made more queries.
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import timeit
+
+import django
+from django.conf import settings
+
+import module_perms
+
+ROWS = 200
+
+settings.configure(
+    SECRET_KEY='django-auth-utils benchmarks',
+    INSTALLED_APPS=[
+        'auth_utils',
+        'django.contrib.auth',
+        'django.contrib.contenttypes',
+    ],
+    DATABASES={
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': ':memory:',
+        },
+    },
+    TEMPLATES=[
+        {
+            'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        },
+    ],
+    AUTHENTICATION_BACKENDS=[__name__ + '.RowBackend'],
+    ROOT_URLCONF=__name__,
+)
+django.setup()
+
+from django.contrib.auth.models import Group, User  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.http import HttpResponse  # noqa: E402
+from django.template import Context, Template  # noqa: E402
+from django.test import RequestFactory  # noqa: E402
+from django.test.utils import CaptureQueriesContext  # noqa: E402
+from django.views.generic import DetailView  # noqa: E402
+
+from auth_utils.backends import BaseAuthorizationBackend  # noqa: E402
+from auth_utils.cache import clear_user_cache  # noqa: E402
+from auth_utils.views import ObjectPermissionRequiredMixin  # noqa: E402
+
+urlpatterns = []
+
+EDITOR_PERMS = {'auth.change_group', 'auth.view_group'}
+
+
+class RowBackend(BaseAuthorizationBackend):
+    """
+    Grant change and view permissions on the groups named "editable ...", with a query per group.
+    """
+
+    def get_user_permissions(self, user_obj, obj=None):
+        if obj is None or not Group.objects.filter(pk=obj.pk, name__startswith='editable').exists():
+            return set()
+        return EDITOR_PERMS
+
+    def get_user_permissions_bulk(self, user_obj, objs):
+        editable = set(Group.objects.filter(
+            pk__in=[obj.pk for obj in objs], name__startswith='editable',
+        ).values_list('pk', flat=True))
+        return {obj: EDITOR_PERMS if obj.pk in editable else set() for obj in objs}
+
+
+class CompactLargeBackend(module_perms.CachedLargeBackend):
+    compact_permissions = True
+
+
+class GroupDetail(ObjectPermissionRequiredMixin, DetailView):
+    model = Group
+    permission_required = 'auth.change_group'
+    raise_exception = True
+
+    def render_to_response(self, context, **response_kwargs):
+        return HttpResponse(self.object.name)
+
+
+TEMPLATES = {
+    'template.can_change': (
+        "{% load auth_utils %}"
+        "{% for group in groups %}{% if user|can_change:group %}{{ group }}{% endif %}{% endfor %}"
+    ),
+    'template.perms': (
+        "{% load auth_utils %}"
+        "{% for group in groups %}"
+        "{% if 'auth.change_group' in user|perms:group %}{{ group }}{% endif %}"
+        "{% if 'auth.view_group' in user|perms:group %}{{ group }}{% endif %}"
+        "{% endfor %}"
+    ),
+}
+
+
+def setup_database():
+    from django.core.management import call_command
+    call_command('migrate', run_syncdb=True, verbosity=0)
+    Group.objects.bulk_create([
+        Group(name='{} {}'.format('editable' if i % 2 else 'readonly', i)) for i in range(ROWS)
+    ])
+    return User.objects.create(username='bench')
+
+
+def measure(func, number):
+    """
+    Return the best time per call of ``func``, and its number of queries.
+    """
+    func()  # Warm up.
+    with CaptureQueriesContext(connection) as queries:
+        func()
+    seconds = min(timeit.repeat(func, number=number, repeat=5)) / number
+    return {'seconds': seconds, 'queries': len(queries)}
+
+
+def bench_backends():
+    results = {}
+    for backend_class in [module_perms.LargeBackend, module_perms.CachedLargeBackend,
+                          CompactLargeBackend]:
+        backend = backend_class()
+        user = module_perms.User()
+        perms = ['app{}.perm{}'.format(app, app) for app in range(module_perms.APPS)]
+
+        def check_perms():
+            for perm in perms:
+                backend.has_perm(user, perm)
+        results['backend.has_perm.' + backend_class.__name__] = measure(check_perms, 5)
+    for backend_class in [module_perms.LargeBackend, module_perms.CachedScanBackend,
+                          module_perms.CachedLargeBackend, CompactLargeBackend]:
+        results['backend.has_module_perms.' + backend_class.__name__] = {
+            'seconds': module_perms.bench(backend_class, number=5),
+            'queries': 0,
+        }
+    return results
+
+
+def bench_templates(user):
+    results = {}
+    groups = list(Group.objects.all())
+    for name, source in sorted(TEMPLATES.items()):
+        variants = [
+            ('unprefetched', source),
+            ('prefetched', source.replace(
+                '{% load auth_utils %}',
+                "{% load auth_utils %}{% prefetch_perms user groups 'change' 'view' %}")),
+            ('authblock', source.replace(
+                '{% load auth_utils %}', '{% load auth_utils %}{% authblock user %}',
+            ) + '{% endauthblock %}'),
+        ]
+        for (variant, variant_source) in variants:
+            template = Template(variant_source)
+            context = Context({'user': user, 'groups': groups})
+
+            def render():
+                clear_user_cache(user)
+                template.render(context)
+            key = '{}.{}'.format(name, variant)
+            results[key] = measure(render, 5)
+    return results
+
+
+def bench_views(user):
+    view = GroupDetail.as_view()
+    editable = Group.objects.filter(name__startswith='editable').first()
+    factory = RequestFactory()
+
+    def get():
+        request = factory.get('/')
+        request.user = User.objects.get(pk=user.pk)
+        view(request, pk=editable.pk)
+    return {'view.ObjectPermissionRequiredMixin': measure(get, 50)}
+
+
+def bench_imports():
+    """
+    Measure the cumulative import time of the main modules, in fresh interpreters.
+    """
+    results = {}
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    django_setup = 'import django; django.setup(); '
+    for (module, setup) in [('auth_utils.backends', ''),
+                            ('auth_utils.views', django_setup),
+                            ('auth_utils.templatetags.auth_utils', django_setup)]:
+        code = (
+            'from django.conf import settings; '
+            'settings.configure(INSTALLED_APPS=["django.contrib.auth", '
+            '"django.contrib.contenttypes"]); '
+        ) + setup + 'import ' + module
+        timings = []
+        for _ in range(5):
+            output = subprocess.check_output(
+                [sys.executable, '-X', 'importtime', '-c', code],
+                stderr=subprocess.STDOUT, env=env, universal_newlines=True)
+            for line in output.splitlines():
+                fields = line.split('|')
+                if len(fields) == 3 and fields[2].strip() == module:
+                    timings.append(int(fields[1]) / 1000000.0)
+        results['import.' + module] = {'seconds': min(timings), 'queries': 0}
+    return results
+
+
+def run():
+    results = bench_imports()
+    user = setup_database()
+    results.update(bench_backends())
+    results.update(bench_templates(user))
+    results.update(bench_views(user))
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """
+    Print ``results`` against ``baseline``, and return whether any of them regressed.
+    """
+    regressed = False
+    for name in sorted(results):
+        result = results[name]
+        before = baseline.get(name)
+        line = '{:55} {:10.3f} ms {:5} queries'.format(
+            name, result['seconds'] * 1000, result['queries'])
+        if before is not None:
+            ratio = result['seconds'] / before['seconds'] if before['seconds'] else 1
+            slower = 1 + tolerance < ratio or before['queries'] < result['queries']
+            regressed = regressed or slower
+            line += '  {:6.2f}x time, {:+d} queries{}'.format(
+                ratio, result['queries'] - before['queries'], '  REGRESSED' if slower else '')
+        print(line)
+    return regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--save', metavar='PATH', help='save the results as JSON')
+    parser.add_argument('--compare', metavar='PATH', help='compare with saved results')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed relative slowdown when comparing (default: 0.25)')
+    args = parser.parse_args(argv)
+
+    results = run()
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    regressed = compare(results, baseline, args.tolerance)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    return 1 if regressed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -23,7 +23,6 @@ setup(
     use_scm_version=True,
 
     install_requires=[
-        'attrs',
         'Django',
     ],
 
@@ -1,3 +1,5 @@
 """
 Django auth utils.
 """
+
+default_app_config = 'auth_utils.apps.AuthUtilsConfig'
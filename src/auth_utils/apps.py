@@ -0,0 +1,13 @@
+"""
+Django app configuration.
+"""
+from django.apps import AppConfig
+
+
+class AuthUtilsConfig(AppConfig):
+    name = 'auth_utils'
+    verbose_name = 'Auth utils'
+
+    def ready(self):
+        from auth_utils.invalidation import connect_signals
+        connect_signals()
@@ -0,0 +1,131 @@
+"""
+Async counterparts of the authorization backend methods.
+
+This module requires Python 3.5+, and asgiref (a dependency of Django 3.0+).
+"""
+
+
+class AsyncAuthorizationMixin(object):
+    """
+    Async permission methods for `BaseAuthorizationBackend`.
+
+    By default, `aget_user_permissions()` and `aget_group_permissions()` run their
+    sync counterparts in a thread. Override them to do truly async I/O: the other
+    methods build on them, and look up user and group permissions concurrently.
+    If a subclass overrides `has_perm()`, `has_module_perms()`, `get_all_permissions()`
+    or `compute_all_permissions()` but not its async counterpart, that counterpart runs
+    the override in a thread instead.
+    """
+
+    async def aget_user_permissions(self, user_obj, obj=None):
+        """
+        Async counterpart of `get_user_permissions()`.
+        """
+        from asgiref.sync import sync_to_async
+        return await sync_to_async(self.get_user_permissions)(user_obj, obj)
+
+    async def aget_group_permissions(self, user_obj, obj=None):
+        """
+        Async counterpart of `get_group_permissions()`.
+        """
+        from asgiref.sync import sync_to_async
+        return await sync_to_async(self.get_group_permissions)(user_obj, obj)
+
+    async def aget_all_permissions(self, user_obj, obj=None):
+        """
+        Async counterpart of `get_all_permissions()`, sharing its cache.
+        """
+        if self._overrides('get_all_permissions'):
+            from asgiref.sync import sync_to_async
+            return await sync_to_async(self.get_all_permissions)(user_obj, obj)
+        if not user_obj.is_active:
+            return set()
+        (cache, key) = self._get_permission_cache(user_obj, obj)
+        if cache is None:
+            return await self.acompute_all_permissions(user_obj, obj)
+        try:
+            return cache[key]
+        except KeyError:
+            perms = cache[key] = await self.acompute_all_permissions(user_obj, obj)
+            return perms
+
+    async def acompute_all_permissions(self, user_obj, obj=None):
+        """
+        Async counterpart of `compute_all_permissions()`.
+        """
+        if (self._overrides('compute_all_permissions') and
+                not self._overrides('acompute_all_permissions')):
+            from asgiref.sync import sync_to_async
+            return await sync_to_async(self.compute_all_permissions)(user_obj, obj)
+        import asyncio  # Imported on first use, to keep importing the backends cheap.
+        (user_perms, group_perms) = await asyncio.gather(
+            self.aget_user_permissions(user_obj, obj),
+            self.aget_group_permissions(user_obj, obj),
+        )
+        return self._union_permissions(user_perms, group_perms)
+
+    async def ahas_perm(self, user_obj, perm, obj=None):
+        """
+        Async counterpart of `has_perm()`.
+        """
+        if self._overrides('has_perm'):
+            from asgiref.sync import sync_to_async
+            return await sync_to_async(self.has_perm)(user_obj, perm, obj)
+        if not user_obj.is_active:
+            return False
+        if self._checks_lazily():
+            return (perm in await self.aget_user_permissions(user_obj, obj) or
+                    perm in await self.aget_group_permissions(user_obj, obj))
+        return perm in await self.aget_all_permissions(user_obj, obj)
+
+    async def ahas_module_perms(self, user_obj, app_label):
+        """
+        Async counterpart of `has_module_perms()`.
+        """
+        if self._overrides('has_module_perms'):
+            from asgiref.sync import sync_to_async
+            return await sync_to_async(self.has_module_perms)(user_obj, app_label)
+        if not user_obj.is_active:
+            return False
+        if self.cache_permissions:
+            index = self._get_cached_module_index(user_obj)
+            if index is None:
+                perms = await self.aget_all_permissions(user_obj)
+                index = self._cache_module_index(user_obj, perms)
+            return app_label in index
+        for perm in await self.aget_all_permissions(user_obj):
+            if perm[:perm.index('.')] == app_label:
+                return True
+        return False
+
+
+class AsyncSharedPermissionCacheMixin(object):
+    """
+    Async lookups for `SharedPermissionCacheMixin`.
+
+    The shared cache is accessed in a thread; the permissions themselves are computed
+    with `acompute_all_permissions()`.
+    """
+
+    async def acompute_all_permissions(self, user_obj, obj=None):
+        from asgiref.sync import sync_to_async
+        (key, perms) = await sync_to_async(self._get_shared_entry)(user_obj, obj)
+        if perms is None:
+            compute = super(AsyncSharedPermissionCacheMixin, self).acompute_all_permissions
+            perms = await compute(user_obj, obj)
+            if key is not None:
+                await sync_to_async(self._set_shared_entry)(key, perms)
+        return perms
+
+
+class AsyncLocalPermissionCacheMixin(object):
+    """
+    Async lookups for `LocalPermissionCacheMixin`.
+
+    The permissions are computed with `compute_all_permissions()` in a thread, so that
+    concurrent sync and async misses share a single computation.
+    """
+
+    async def acompute_all_permissions(self, user_obj, obj=None):
+        from asgiref.sync import sync_to_async
+        return await sync_to_async(self.compute_all_permissions)(user_obj, obj)
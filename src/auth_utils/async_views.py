@@ -0,0 +1,121 @@
+"""
+Auth-related async view utils.
+
+This module requires Django 4.1+, for the async ORM interface.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.http import Http404
+from django.utils.translation import gettext as _
+
+from django.contrib.auth.mixins import PermissionRequiredMixin
+from auth_utils.evaluation import has_no_perms
+from auth_utils.views import ObjectPermissionRequiredMixin
+
+
+class AsyncObjectPermissionRequiredMixin(ObjectPermissionRequiredMixin):
+    """
+    Async variant of `ObjectPermissionRequiredMixin`, for views with async handlers.
+
+    The object is fetched with the async ORM, and the required permissions are
+    checked concurrently, stopping as soon as the result is known. As in the sync mixin,
+    the object is stored as ``self.object``, and reused by `get_object()`.
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        if not await self.ahas_permission():
+            # This may load the user (for is_authenticated), which can't be done synchronously here.
+            return await sync_to_async(self.handle_no_permission)()
+        # Skip PermissionRequiredMixin's sync check.
+        return await super(PermissionRequiredMixin, self).dispatch(request, *args, **kwargs)
+
+    async def ahas_permission(self):
+        """
+        Async counterpart of `has_permission()`.
+        """
+        perms = self.get_permission_required()
+        user = await _aget_user(self.request)
+        if has_no_perms(user):
+            return False
+        obj = await self.aget_object()
+        return await _concurrently(
+            (_ahas_perm(user, perm, obj) for perm in perms),
+            require_all=self.permission_require_all,
+        )
+
+    async def aget_object(self, queryset=None):
+        """
+        Async counterpart of `get_object()`, sharing its reuse of the object.
+        """
+        if queryset is None:
+            if hasattr(self, '_permission_object'):
+                return self._permission_object
+            obj = self.object = self._permission_object = await self._aget_object()
+            return obj
+        return await self._aget_object(queryset)
+
+    async def _aget_object(self, queryset=None):
+        # Referenced from SingleObjectMixin.get_object()
+        if queryset is None:
+            queryset = self.get_queryset()
+
+        pk = self.kwargs.get(self.pk_url_kwarg)
+        slug = self.kwargs.get(self.slug_url_kwarg)
+        if pk is not None:
+            queryset = queryset.filter(pk=pk)
+
+        if slug is not None and (pk is None or self.query_pk_and_slug):
+            slug_field = self.get_slug_field()
+            queryset = queryset.filter(**{slug_field: slug})
+
+        if pk is None and slug is None:
+            raise AttributeError(
+                "Generic detail view %s must be called with either an object "
+                "pk or a slug in the URLconf." % self.__class__.__name__
+            )
+
+        try:
+            return await queryset.aget()
+        except queryset.model.DoesNotExist:
+            raise Http404(
+                _("No %(verbose_name)s found matching the query")
+                % {"verbose_name": queryset.model._meta.verbose_name}
+            )
+
+
+async def _aget_user(request):
+    """
+    Return the request's user, using ``request.auser()`` where available (Django 5.0+).
+    """
+    auser = getattr(request, 'auser', None)
+    if auser is not None:
+        return await auser()
+    return request.user
+
+
+async def _ahas_perm(user, perm, obj):
+    """
+    Return ``user.ahas_perm(perm, obj)``, falling back to ``user.has_perm()`` in a thread.
+    """
+    ahas_perm = getattr(user, 'ahas_perm', None)
+    if ahas_perm is not None:
+        return await ahas_perm(perm, obj)
+    return await sync_to_async(user.has_perm)(perm, obj)
+
+
+async def _concurrently(awaitables, require_all):
+    """
+    Return true if all (or any) of the awaitables return true, running them concurrently.
+
+    The remaining awaitables are cancelled as soon as the result is known.
+    """
+    tasks = [asyncio.ensure_future(awaitable) for awaitable in awaitables]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            if bool(await next_done) is not require_all:
+                return not require_all
+        return require_all
+    finally:
+        for task in tasks:
+            task.cancel()
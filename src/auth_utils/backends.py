@@ -1,13 +1,53 @@
 """
 Django authentication backend implementation helpers.
 """
+import sys
+from itertools import islice
 
+from auth_utils import instrumentation
+from auth_utils.cache import get_object_key, get_user_cache, clear_user_cache
+from auth_utils.instrumentation import instrumented
+from auth_utils.perms import PermissionSet
 
-class BaseAuthorizationBackend:
+if (3, 5) <= sys.version_info:
+    from auth_utils.async_backends import AsyncAuthorizationMixin
+else:
+    AsyncAuthorizationMixin = object
+
+# Cache key of the `has_module_perms()` index, next to the per-object keys.
+_MODULE_INDEX = object()
+
+
+class BaseAuthorizationBackend(AsyncAuthorizationMixin):
     """
     Base implementation of an authorization backend.
+
+    On Python 3.5+, this includes async counterparts of the permission methods:
+    see `AsyncAuthorizationMixin`.
     """
 
+    #: Set this to memoize `get_all_permissions()` on the user object, per object.
+    #: Like `ModelBackend`'s ``_perm_cache``, the cache lives as long as the user object.
+    cache_permissions = False
+
+    #: Set this to return `PermissionSet` bitsets from `compute_all_permissions()`.
+    #: These take less memory and are faster to combine than sets of strings, for
+    #: users with many permissions: this pays off with `cache_permissions`.
+    compact_permissions = False
+
+    #: Let `has_perm()` check `get_user_permissions()` before `get_group_permissions()`,
+    #: and skip the latter when the former grants the permission. This only applies when
+    #: `cache_permissions` is off, and `get_all_permissions()` is not customized.
+    lazy_permission_checks = True
+
+    #: Whether this backend denies all permissions to inactive (and anonymous) users, as it does
+    #: by default. Helpers like the template filters skip the backends for inactive users if
+    #: they all do: set this to false if you override the permission methods to grant any.
+    denies_inactive_users = True
+
+    #: The number of objects per `has_perm_bulk()` call in the default `filter_queryset()`.
+    filter_queryset_chunk_size = 1000
+
     def authenticate(self):
         """
         Does nothing.
@@ -32,6 +72,24 @@ class BaseAuthorizationBackend:
         """
         return set()
 
+    def get_user_permissions_bulk(self, user_obj, objs):
+        """
+        Return a mapping of each of ``objs`` to its `get_user_permissions()`.
+
+        Extend this to look up the permissions for many objects at once.
+        """
+        return {obj: self.get_user_permissions(user_obj, obj) for obj in objs}
+
+    def get_group_permissions_bulk(self, user_obj, objs):
+        """
+        Return a mapping of each of ``objs`` to its `get_group_permissions()`.
+
+        Extend this to look up the permissions for many objects at once.
+        """
+        return {obj: self.get_group_permissions(user_obj, obj) for obj in objs}
+
+    @instrumented('backend.get_all_permissions',
+                  lambda self, user_obj, obj=None: dict(obj=obj, backend=self))
     def get_all_permissions(self, user_obj, obj=None):
         """
         Base implementation of `get_all_permissions()`,
@@ -39,11 +97,119 @@ class BaseAuthorizationBackend:
         """
         if not user_obj.is_active:
             return set()
+        (cache, key) = self._get_permission_cache(user_obj, obj)
+        if cache is None:
+            return self.compute_all_permissions(user_obj, obj)
+        try:
+            perms = cache[key]
+        except KeyError:
+            perms = cache[key] = self.compute_all_permissions(user_obj, obj)
+            hit = False
         else:
-            user_perms = self.get_user_permissions(user_obj, obj)
-            group_perms = self.get_group_permissions(user_obj, obj)
-            return user_perms | group_perms
+            hit = True
+        if instrumentation.sinks:
+            instrumentation.record('backend.cache', obj=obj, backend=self, hit=hit)
+        return perms
+
+    def _get_permission_cache(self, user_obj, obj):
+        """
+        Return `get_all_permissions()`'s cache and the key of ``obj`` in it, or ``(None, None)``.
+        """
+        if not self.cache_permissions:
+            return (None, None)
+        try:
+            key = get_object_key(obj)
+        except TypeError:
+            # Unhashable objects (such as unsaved model instances) are not cached.
+            return (None, None)
+        return (get_user_cache(user_obj, type(self)), key)
+
+    def compute_all_permissions(self, user_obj, obj=None):
+        """
+        Compute the permissions that `get_all_permissions()` returns, bypassing its cache.
+        """
+        user_perms = self.get_user_permissions(user_obj, obj)
+        group_perms = self.get_group_permissions(user_obj, obj)
+        return self._union_permissions(user_perms, group_perms)
+
+    def _union_permissions(self, user_perms, group_perms):
+        """
+        Combine user and group permissions, which may be any iterables of permission strings.
+        """
+        if self.compact_permissions:
+            return PermissionSet(user_perms) | PermissionSet(group_perms)
+        perms = set(user_perms)
+        perms.update(group_perms)
+        return perms
+
+    @instrumented('backend.get_all_permissions_bulk',
+                  lambda self, user_obj, objs: dict(backend=self))
+    def get_all_permissions_bulk(self, user_obj, objs):
+        """
+        Return a mapping of each of ``objs`` to its `get_all_permissions()`.
+
+        This is based on `get_user_permissions_bulk()` and `get_group_permissions_bulk()`,
+        and shares `get_all_permissions()`'s cache: only uncached objects are looked up,
+        and the results are cached for later checks. The objects must be hashable.
+
+        If a subclass overrides `get_all_permissions()` but not this method, this calls it
+        for each object instead.
+        """
+        objs = list(objs)
+        if self._overrides('get_all_permissions'):
+            return {obj: self.get_all_permissions(user_obj, obj) for obj in objs}
+        if not user_obj.is_active:
+            return {obj: set() for obj in objs}
+        if not self.cache_permissions:
+            return self.compute_all_permissions_bulk(user_obj, objs)
+        cache = get_user_cache(user_obj, type(self))
+        all_perms = {}
+        missing = []
+        for obj in objs:
+            try:
+                all_perms[obj] = cache[get_object_key(obj)]
+            except KeyError:
+                missing.append(obj)
+        if missing:
+            for obj, perms in self.compute_all_permissions_bulk(user_obj, missing).items():
+                all_perms[obj] = cache[get_object_key(obj)] = perms
+        return all_perms
+
+    def compute_all_permissions_bulk(self, user_obj, objs):
+        """
+        Compute the permissions that `get_all_permissions_bulk()` returns, bypassing its cache.
+
+        If a subclass overrides `compute_all_permissions()` but not this method, this calls it
+        for each object instead.
+        """
+        if (self._overrides('compute_all_permissions') and
+                not self._overrides('compute_all_permissions_bulk')):
+            return {obj: self.compute_all_permissions(user_obj, obj) for obj in objs}
+        user_perms = self.get_user_permissions_bulk(user_obj, objs)
+        group_perms = self.get_group_permissions_bulk(user_obj, objs)
+        return {obj: self._union_permissions(user_perms[obj], group_perms[obj]) for obj in objs}
 
+    def clear_permission_cache(self, user_obj, *objs):
+        """
+        Clear this backend's cached permissions for ``user_obj``.
+
+        If any ``objs`` are given, only clear the permissions cached for them
+        (`None` stands for the global permissions); otherwise, clear everything.
+        """
+        if not objs:
+            clear_user_cache(user_obj, type(self))
+            return
+        cache = get_user_cache(user_obj, type(self))
+        for obj in objs:
+            if obj is None:
+                cache.pop(_MODULE_INDEX, None)
+            try:
+                cache.pop(get_object_key(obj), None)
+            except TypeError:
+                pass
+
+    @instrumented('backend.has_perm',
+                  lambda self, user_obj, perm, obj=None: dict(perm=perm, obj=obj, backend=self))
     def has_perm(self, user_obj, perm, obj=None):
         """
         Base implementation of `has_perm()`, based on `get_all_permissions()`.
@@ -51,8 +217,57 @@ class BaseAuthorizationBackend:
         # Referenced from ModelBackend.has_perm()
         if not user_obj.is_active:
             return False
+        if self._checks_lazily():
+            return (perm in self.get_user_permissions(user_obj, obj) or
+                    perm in self.get_group_permissions(user_obj, obj))
         return perm in self.get_all_permissions(user_obj, obj)
 
+    def _checks_lazily(self):
+        """
+        Return true if `has_perm()` can check user and group permissions separately.
+        """
+        if not self.lazy_permission_checks or self.cache_permissions:
+            return False
+        cls = type(self)
+        return (_function(cls.get_all_permissions) is _base_get_all_permissions and
+                _function(cls.compute_all_permissions) is _base_compute_all_permissions)
+
+    def _overrides(self, name):
+        """
+        Return true if this backend's class overrides the method ``name``.
+        """
+        return (_function(getattr(type(self), name)) is not
+                _function(getattr(BaseAuthorizationBackend, name)))
+
+    def has_perm_bulk(self, user_obj, perm, objs):
+        """
+        Return a mapping of each of ``objs`` to its `has_perm()`,
+        based on `get_all_permissions_bulk()`.
+
+        If a subclass overrides `has_perm()`, this calls it for each object instead.
+        """
+        if self._overrides('has_perm'):
+            return {obj: self.has_perm(user_obj, perm, obj) for obj in objs}
+        all_perms = self.get_all_permissions_bulk(user_obj, objs)
+        return {obj: perm in perms for (obj, perms) in all_perms.items()}
+
+    def filter_queryset(self, user_obj, perm, queryset):
+        """
+        Return ``queryset`` narrowed to the objects on which ``user_obj`` has ``perm``.
+
+        By default, this iterates over the queryset in chunks, using `has_perm_bulk()`.
+        Extend this to do the filtering in the database instead.
+        """
+        if not user_obj.is_active:
+            return queryset.none()
+        pks = []
+        for chunk in _chunked(queryset.iterator(), self.filter_queryset_chunk_size):
+            permitted = self.has_perm_bulk(user_obj, perm, chunk)
+            pks.extend(obj.pk for obj in chunk if permitted[obj])
+        return queryset.filter(pk__in=pks)
+
+    @instrumented('backend.has_module_perms',
+                  lambda self, user_obj, app_label: dict(perm=app_label, backend=self))
     def has_module_perms(self, user_obj, app_label):
         """
         Base implementation of `has_module_perms()`, using `get_all_permissions()`.
@@ -60,7 +275,51 @@ class BaseAuthorizationBackend:
         # Referenced from ModelBackend.has_module_perms()
         if not user_obj.is_active:
             return False
+        if self.cache_permissions:
+            return app_label in self._get_module_index(user_obj)
         for perm in self.get_all_permissions(user_obj):
             if perm[:perm.index('.')] == app_label:
                 return True
         return False
+
+    def _get_module_index(self, user_obj):
+        """
+        Return the user's global permissions indexed by app label, cached alongside them.
+        """
+        index = self._get_cached_module_index(user_obj)
+        if index is None:
+            index = self._cache_module_index(user_obj, self.get_all_permissions(user_obj))
+        return index
+
+    def _get_cached_module_index(self, user_obj):
+        return get_user_cache(user_obj, type(self)).get(_MODULE_INDEX)
+
+    def _cache_module_index(self, user_obj, perms):
+        index = {}
+        for perm in perms:
+            index.setdefault(perm[:perm.index('.')], set()).add(perm)
+        get_user_cache(user_obj, type(self))[_MODULE_INDEX] = index
+        return index
+
+
+def _function(method):
+    """
+    Return the function of ``method``, unwrapping Python 2's unbound methods.
+    """
+    return getattr(method, '__func__', method)
+
+
+_base_get_all_permissions = _function(BaseAuthorizationBackend.get_all_permissions)
+_base_compute_all_permissions = _function(BaseAuthorizationBackend.compute_all_permissions)
+
+
+def _chunked(iterable, size):
+    """
+    Yield lists of up to ``size`` items from ``iterable``.
+    """
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
@@ -0,0 +1,99 @@
+"""
+Permission check budgets, for catching N+1 permission checks.
+"""
+import logging
+import threading
+import warnings
+
+from auth_utils import instrumentation
+from auth_utils.cache import get_object_key
+
+logger = logging.getLogger(__name__)
+
+
+class PermissionBudgetExceeded(AssertionError):
+    """
+    Raised by a `PermissionBudget` with ``action='raise'``.
+    """
+
+
+class PermissionBudgetWarning(UserWarning):
+    """
+    Warned by a `PermissionBudget` with ``action='warn'``.
+    """
+
+
+class PermissionBudget(object):
+    """
+    Count the permission checks made by authentication backends in the current thread.
+
+    This counts the instrumented `has_perm()`, `has_module_perms()`, `get_all_permissions()`
+    and `get_all_permissions_bulk()` calls of backends based on `BaseAuthorizationBackend`
+    (only the outermost one, when they call each other), and acts when there are more than
+    ``max_checks`` of them, or (unless ``allow_repeats``) when the same backend is asked the
+    same question twice. The ``action`` is one of ``'raise'`` (`PermissionBudgetExceeded`),
+    ``'warn'`` (`PermissionBudgetWarning`), or ``'log'`` (a warning on this module's logger).
+
+    Use it as a context manager, for example in tests::
+
+        with PermissionBudget(max_checks=10, allow_repeats=False):
+            client.get('/articles/')
+    """
+
+    counted_kinds = frozenset([
+        'backend.has_perm', 'backend.has_module_perms',
+        'backend.get_all_permissions', 'backend.get_all_permissions_bulk',
+    ])
+
+    def __init__(self, max_checks=None, allow_repeats=True, action='raise'):
+        if action not in {'raise', 'warn', 'log'}:
+            raise ValueError('Unknown action: {!r}'.format(action))
+        self.max_checks = max_checks
+        self.allow_repeats = allow_repeats
+        self.action = action
+        self.checks = 0
+        self.repeats = []
+        self._seen = set()
+        self._thread = None
+
+    def __enter__(self):
+        self._thread = threading.current_thread()
+        instrumentation.add_sink(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        instrumentation.remove_sink(self)
+        self._thread = None
+
+    def __call__(self, event):
+        if event.kind not in self.counted_kinds or threading.current_thread() is not self._thread:
+            return
+        if not self.counted_kinds.isdisjoint(instrumentation.calls_in_progress()):
+            # Part of an enclosing call, which is counted instead.
+            return
+        self.checks += 1
+        if self.max_checks is not None and self.checks == self.max_checks + 1:
+            self._exceeded('More than {} permission checks: {} of {!r} on {!r}'.format(
+                self.max_checks, event.backend, event.perm, event.obj))
+        if event.kind == 'backend.get_all_permissions_bulk':
+            # Bulk calls are for distinct objects: they are only counted.
+            return
+        try:
+            key = (event.kind, event.backend, event.perm, get_object_key(event.obj))
+        except TypeError:
+            key = (event.kind, event.backend, event.perm, id(event.obj))
+        if key in self._seen:
+            self.repeats.append(event)
+            if not self.allow_repeats:
+                self._exceeded('Repeated permission check: {} of {!r} on {!r}'.format(
+                    event.backend, event.perm, event.obj))
+        else:
+            self._seen.add(key)
+
+    def _exceeded(self, message):
+        if self.action == 'raise':
+            raise PermissionBudgetExceeded(message)
+        elif self.action == 'warn':
+            warnings.warn(message, PermissionBudgetWarning, stacklevel=2)
+        else:
+            logger.warning(message)
@@ -0,0 +1,526 @@
+"""
+Permission caching helpers.
+"""
+import sys
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+if (3, 5) <= sys.version_info:
+    from auth_utils.async_backends import (
+        AsyncLocalPermissionCacheMixin, AsyncSharedPermissionCacheMixin,
+    )
+else:
+    AsyncLocalPermissionCacheMixin = AsyncSharedPermissionCacheMixin = object
+
+# Name of the attribute holding auth_utils' per-user caches.
+# Compare ModelBackend's `_perm_cache` and `_user_perm_cache`.
+USER_CACHE_ATTR = '_auth_utils_cache'
+
+
+def get_object_key(obj):
+    """
+    Return a hashable cache key identifying ``obj``, or raise `TypeError` if it cannot be cached.
+
+    Saved model instances are identified by their type and primary key, so that
+    different instances of the same database row share a key. Other objects are
+    keyed by identity: the key holds a reference to the object, so it cannot be
+    mistaken for a later object reusing the same ``id()``.
+    """
+    if obj is None:
+        return None
+    pk = getattr(obj, 'pk', None)
+    if pk is not None:
+        return (type(obj), pk)
+    hash(obj)  # Raise TypeError early for unhashable objects, such as unsaved model instances.
+    return _IdentityKey(obj)
+
+
+class _IdentityKey(object):
+    """
+    Cache key of an object, compared by identity rather than equality.
+    """
+    __slots__ = ('obj',)
+
+    def __init__(self, obj):
+        self.obj = obj
+
+    def __eq__(self, other):
+        return isinstance(other, _IdentityKey) and other.obj is self.obj
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return id(self.obj)
+
+
+def get_user_cache(user_obj, namespace):
+    """
+    Return the cache dictionary for ``namespace``, stored on ``user_obj``.
+
+    Like Django's ``_perm_cache``, this lives as long as the user object does:
+    typically a single request.
+    """
+    try:
+        caches = getattr(user_obj, USER_CACHE_ATTR)
+    except AttributeError:
+        caches = {}
+        setattr(user_obj, USER_CACHE_ATTR, caches)
+    return caches.setdefault(namespace, {})
+
+
+def clear_user_cache(user_obj, namespace=None):
+    """
+    Clear the caches stored on ``user_obj``: all of them, or only ``namespace``.
+    """
+    caches = getattr(user_obj, USER_CACHE_ATTR, None)
+    if caches is None:
+        return
+    if namespace is None:
+        caches.clear()
+    else:
+        caches.pop(namespace, None)
+
+
+class SharedPermissionCacheMixin(AsyncSharedPermissionCacheMixin):
+    """
+    Authorization backend mixin: share computed permissions between processes with Django's cache.
+
+    Use this with `BaseAuthorizationBackend`::
+
+        class ArticlePolicy(SharedPermissionCacheMixin, BaseAuthorizationBackend):
+            permission_cache_alias = 'permissions'
+
+    Permissions are cached per user and object, and only for saved users and objects:
+    the global permissions, and those of model instances. Entries are versioned rather
+    than deleted: `clear_shared_permission_cache()` bumps a version number, which makes
+    all older entries for a user (or everyone) unreachable at once.
+    """
+
+    #: The alias of the Django cache to use.
+    permission_cache_alias = 'default'
+
+    #: How long to cache permissions, in seconds.
+    permission_cache_timeout = 300
+
+    #: The prefix of this mixin's cache keys.
+    permission_cache_prefix = 'auth_utils.perms'
+
+    def compute_all_permissions(self, user_obj, obj=None):
+        """
+        Look up the permissions in the shared cache before computing them.
+        """
+        (key, perms) = self._get_shared_entry(user_obj, obj)
+        if perms is None:
+            perms = super(SharedPermissionCacheMixin, self).compute_all_permissions(user_obj, obj)
+            if key is not None:
+                self._set_shared_entry(key, perms)
+        return perms
+
+    def _get_shared_entry(self, user_obj, obj):
+        """
+        Return the cache key for ``user_obj`` and ``obj``, and the cached permissions.
+
+        Either may be `None`: the key if the pair is not cacheable, and the permissions on a miss.
+        """
+        obj_key = _get_shared_object_key(obj)
+        if user_obj.pk is None or obj_key is None:
+            return (None, None)
+        cache = self._get_shared_cache()
+        key = self._get_shared_key_prefix(cache, user_obj) + obj_key
+        return (key, cache.get(key))
+
+    def _set_shared_entry(self, key, perms):
+        self._get_shared_cache().set(key, perms, self.permission_cache_timeout)
+
+    def compute_all_permissions_bulk(self, user_obj, objs):
+        """
+        Look up the permissions in the shared cache before computing them, with one round trip.
+        """
+        compute_bulk = super(SharedPermissionCacheMixin, self).compute_all_permissions_bulk
+        if user_obj.pk is None:
+            return compute_bulk(user_obj, objs)
+        cache = self._get_shared_cache()
+        prefix = self._get_shared_key_prefix(cache, user_obj)
+        keys = {}
+        for obj in objs:
+            obj_key = _get_shared_object_key(obj)
+            if obj_key is not None:
+                keys[obj] = prefix + obj_key
+        cached = cache.get_many(list(keys.values()))
+        all_perms = {}
+        missing = []
+        for obj in objs:
+            try:
+                all_perms[obj] = cached[keys[obj]]
+            except KeyError:
+                missing.append(obj)
+        if missing:
+            computed = compute_bulk(user_obj, missing)
+            all_perms.update(computed)
+            cache.set_many({keys[obj]: computed[obj] for obj in missing if obj in keys},
+                           self.permission_cache_timeout)
+        return all_perms
+
+    @classmethod
+    def clear_shared_permission_cache(cls, user_obj=None):
+        """
+        Invalidate the shared cached permissions of ``user_obj``, or of all users.
+        """
+        cache = cls._get_shared_cache()
+        if user_obj is None:
+            key = cls._get_version_key('all')
+        else:
+            key = cls._get_version_key(user_obj.pk)
+        try:
+            cache.incr(key)
+        except ValueError:
+            # The key is missing: any fresh version invalidates the old entries.
+            cache.add(key, _new_version(), None)
+
+    @classmethod
+    def invalidate_cached_permissions(cls, user_obj=None, obj=None):
+        """
+        Hook for `auth_utils.invalidation.invalidate_permissions()`.
+
+        This invalidates all of the user's objects: entries are not versioned per object.
+        """
+        cls.clear_shared_permission_cache(user_obj)
+
+    @classmethod
+    def _get_shared_cache(cls):
+        from django.core.cache import caches
+        return caches[cls.permission_cache_alias]
+
+    @classmethod
+    def _get_version_key(cls, name):
+        return '{}:version:{}'.format(cls.permission_cache_prefix, name)
+
+    def _get_shared_key_prefix(self, cache, user_obj):
+        """
+        Return the prefix of ``user_obj``'s current cache keys for this backend.
+        """
+        version_keys = [self._get_version_key('all'), self._get_version_key(user_obj.pk)]
+        versions = cache.get_many(version_keys)
+        for key in version_keys:
+            if key not in versions:
+                # Versions never expire, but they may still be evicted.
+                cache.add(key, _new_version(), None)
+                versions[key] = cache.get(key)
+        return '{}:{}.{}:{}:{}:{}:'.format(
+            self.permission_cache_prefix,
+            type(self).__module__, type(self).__name__,
+            versions[version_keys[0]], user_obj.pk, versions[version_keys[1]],
+        )
+
+
+def _get_shared_object_key(obj):
+    """
+    Return a cache key string for ``obj`` that is valid across processes, or `None`.
+    """
+    if obj is None:
+        return 'global'
+    opts = getattr(obj, '_meta', None)
+    pk = getattr(obj, 'pk', None)
+    if opts is None or pk is None:
+        return None
+    return '{}.{}:{}'.format(opts.app_label, opts.model_name, pk)
+
+
+def _new_version():
+    """
+    Return an initial version number, distinct from those of earlier, evicted versions.
+    """
+    return int(time.time() * 1000000)
+
+
+#: Statistics of a `PermissionCache`.
+CacheStats = namedtuple('CacheStats', ['hits', 'misses', 'evictions', 'size'])
+
+_clock = getattr(time, 'monotonic', time.time)
+
+
+class PermissionCache(object):
+    """
+    A bounded, thread-safe in-process cache, with LRU eviction and per-entry timeouts.
+
+    The keys are spread over ``stripes`` independently locked segments, each holding up to
+    ``max_size / stripes`` entries, so that threads using different keys don't contend.
+    `get_or_compute()` is single-flight: concurrent misses for the same key wait for
+    one computation, instead of each computing the value.
+    """
+
+    def __init__(self, max_size=10000, timeout=300, stripes=16):
+        self.timeout = timeout
+        stripe_size = max(1, max_size // stripes)
+        self._stripes = [_CacheStripe(stripe_size) for _ in range(stripes)]
+
+    def get_or_compute(self, key, compute, timeout=None):
+        """
+        Return the value cached for ``key``, or cache and return ``compute()``.
+
+        ``timeout`` overrides the cache's timeout for this entry, in seconds.
+        """
+        stripe = self._get_stripe(key)
+        with stripe.lock:
+            now = _clock()
+            entry = stripe.entries.get(key)
+            if entry is not None and now < entry[1]:
+                stripe.touch(key)
+                stripe.hits += 1
+                return entry[0]
+            stripe.misses += 1
+            flight = stripe.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = stripe.flights[key] = _Flight()
+        if not leader:
+            return flight.wait()
+
+        try:
+            value = compute()
+        except BaseException as e:
+            with stripe.lock:
+                del stripe.flights[key]
+            flight.finish(error=e)
+            raise
+        with stripe.lock:
+            del stripe.flights[key]
+            if flight.valid:
+                if timeout is None:
+                    timeout = self.timeout
+                stripe.put(key, value, _clock() + timeout)
+        flight.finish(value)
+        return value
+
+    def get_many_or_compute(self, keys, compute_many, timeout=None):
+        """
+        Return a mapping of ``keys`` to their cached values, computing the missing ones at once.
+
+        ``compute_many(missing)`` receives a list of the missing keys, and returns a mapping of
+        them to their values. Like `get_or_compute()`, this is single-flight: keys that another
+        thread is already computing are waited for, rather than computed again.
+        """
+        values = {}
+        leading = {}
+        waiting = {}
+        for key in keys:
+            stripe = self._get_stripe(key)
+            with stripe.lock:
+                entry = stripe.entries.get(key)
+                if entry is not None and _clock() < entry[1]:
+                    stripe.touch(key)
+                    stripe.hits += 1
+                    values[key] = entry[0]
+                    continue
+                stripe.misses += 1
+                flight = stripe.flights.get(key)
+                if flight is None:
+                    flight = stripe.flights[key] = _Flight()
+                    leading[key] = (stripe, flight)
+                else:
+                    waiting[key] = flight
+
+        if leading:
+            try:
+                computed = compute_many(list(leading))
+                missing = [computed[key] for key in leading]
+            except BaseException as e:
+                for (key, (stripe, flight)) in leading.items():
+                    with stripe.lock:
+                        del stripe.flights[key]
+                    flight.finish(error=e)
+                raise
+            if timeout is None:
+                timeout = self.timeout
+            for (key, (stripe, flight)), value in zip(leading.items(), missing):
+                with stripe.lock:
+                    del stripe.flights[key]
+                    if flight.valid:
+                        stripe.put(key, value, _clock() + timeout)
+                flight.finish(value)
+                values[key] = value
+        for (key, flight) in waiting.items():
+            values[key] = flight.wait()
+        return values
+
+    def invalidate(self, predicate=None):
+        """
+        Remove the entries whose key satisfies ``predicate``, or all entries.
+
+        Values being computed for these keys are not cached.
+        """
+        for stripe in self._stripes:
+            with stripe.lock:
+                for key in list(stripe.entries):
+                    if predicate is None or predicate(key):
+                        del stripe.entries[key]
+                for key, flight in stripe.flights.items():
+                    if predicate is None or predicate(key):
+                        flight.valid = False
+
+    def clear(self):
+        """
+        Remove all entries, and reset the statistics.
+        """
+        self.invalidate()
+        for stripe in self._stripes:
+            with stripe.lock:
+                stripe.hits = stripe.misses = stripe.evictions = 0
+
+    @property
+    def stats(self):
+        """
+        Return the hits, misses, evictions and size of the cache, as `CacheStats`.
+        """
+        totals = [0, 0, 0, 0]
+        for stripe in self._stripes:
+            with stripe.lock:
+                counts = (stripe.hits, stripe.misses, stripe.evictions, len(stripe.entries))
+            totals = [total + count for (total, count) in zip(totals, counts)]
+        return CacheStats(*totals)
+
+    def _get_stripe(self, key):
+        return self._stripes[hash(key) % len(self._stripes)]
+
+
+class _CacheStripe(object):
+    """
+    A segment of a `PermissionCache`: entries map keys to ``(value, expiry)`` in LRU order.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.flights = {}
+        self.hits = self.misses = self.evictions = 0
+
+    def touch(self, key):
+        self.entries[key] = self.entries.pop(key)
+
+    def put(self, key, value, expiry):
+        self.entries.pop(key, None)
+        self.entries[key] = (value, expiry)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+
+class _Flight(object):
+    """
+    A computation in progress, that other threads can wait for.
+    """
+
+    def __init__(self):
+        self.valid = True
+        self._done = threading.Event()
+        self._value = None
+        self._error = None
+
+    def finish(self, value=None, error=None):
+        self._value = value
+        self._error = error
+        self._done.set()
+
+    def wait(self):
+        self._done.wait()
+        if self._error is not None:
+            raise self._error
+        return self._value
+
+
+class LocalPermissionCacheMixin(AsyncLocalPermissionCacheMixin):
+    """
+    Authorization backend mixin: share computed permissions between requests, in this process.
+
+    Use this with `BaseAuthorizationBackend`::
+
+        class ArticlePolicy(LocalPermissionCacheMixin, BaseAuthorizationBackend):
+            local_permission_cache_size = 50000
+
+    Each backend class has its own `PermissionCache`. Permissions are cached per user and
+    object, for saved users and objects only. `invalidate_cached_permissions()` only
+    affects the current process: other processes see changes when their entries expire.
+    The cached permission sets are shared between threads: do not modify them.
+    """
+
+    #: The maximum number of entries of the cache.
+    local_permission_cache_size = 10000
+
+    #: How long to cache permissions, in seconds.
+    local_permission_cache_timeout = 60
+
+    def compute_all_permissions(self, user_obj, obj=None):
+        """
+        Look up the permissions in the local cache before computing them.
+        """
+        compute = super(LocalPermissionCacheMixin, self).compute_all_permissions
+        if user_obj.pk is None or (obj is not None and getattr(obj, 'pk', None) is None):
+            return compute(user_obj, obj)
+        key = (user_obj.pk, get_object_key(obj))
+        return self.get_local_permission_cache().get_or_compute(
+            key, lambda: compute(user_obj, obj))
+
+    def compute_all_permissions_bulk(self, user_obj, objs):
+        """
+        Look up the permissions in the local cache before computing the missing ones at once.
+        """
+        compute_bulk = super(LocalPermissionCacheMixin, self).compute_all_permissions_bulk
+        if user_obj.pk is None:
+            return compute_bulk(user_obj, objs)
+        keys = {}
+        uncached = []
+        objs = list(objs)
+        for obj in objs:
+            if obj is not None and getattr(obj, 'pk', None) is None:
+                uncached.append(obj)
+            else:
+                keys[obj] = (user_obj.pk, get_object_key(obj))
+        objs_by_key = {key: obj for (obj, key) in keys.items()}
+
+        def compute_many(missing):
+            computed = compute_bulk(user_obj, [objs_by_key[key] for key in missing])
+            return {key: computed[objs_by_key[key]] for key in missing}
+
+        cached = self.get_local_permission_cache().get_many_or_compute(
+            list(OrderedDict.fromkeys(keys[obj] for obj in objs if obj in keys)), compute_many)
+        all_perms = {obj: cached[key] for (obj, key) in keys.items()}
+        if uncached:
+            all_perms.update(compute_bulk(user_obj, uncached))
+        return all_perms
+
+    @classmethod
+    def get_local_permission_cache(cls):
+        """
+        Return this backend class's `PermissionCache`, creating it if needed.
+        """
+        cache = cls.__dict__.get('_local_permission_cache')
+        if cache is None:
+            with _local_caches_lock:
+                cache = cls.__dict__.get('_local_permission_cache')
+                if cache is None:
+                    cache = PermissionCache(cls.local_permission_cache_size,
+                                            cls.local_permission_cache_timeout)
+                    cls._local_permission_cache = cache
+        return cache
+
+    @classmethod
+    def invalidate_cached_permissions(cls, user_obj=None, obj=None):
+        """
+        Hook for `auth_utils.invalidation.invalidate_permissions()`.
+        """
+        if user_obj is None and obj is None:
+            predicate = None
+        else:
+            user_pk = None if user_obj is None else user_obj.pk
+            obj_key = None if obj is None else get_object_key(obj)
+
+            def predicate(key):
+                return ((user_obj is None or key[0] == user_pk) and
+                        (obj is None or key[1] == obj_key))
+        cls.get_local_permission_cache().invalidate(predicate)
+
+
+_local_caches_lock = threading.Lock()
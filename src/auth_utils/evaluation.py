@@ -0,0 +1,195 @@
+"""
+Permission evaluation across authentication backends.
+"""
+from timeit import default_timer
+
+from django.conf import settings
+from django.contrib.auth import get_backends
+from django.core.exceptions import PermissionDenied
+from django.utils.module_loading import import_string
+
+from auth_utils.backends import BaseAuthorizationBackend
+
+# The observed cost of each backend class: [total seconds, number of calls].
+_backend_costs = {}
+
+# Whether each configured AUTHENTICATION_BACKENDS denies inactive users: see `has_no_perms()`.
+_deny_inactive = {}
+
+# Whether each user class has Django's permission checks: see `has_default_perm_checks()`.
+_default_perm_checks = {}
+
+
+def has_no_perms(user):
+    """
+    Return true if ``user`` is known to have no permissions, without asking the backends.
+
+    This is the case for inactive and anonymous users, if all the configured backends deny
+    inactive users: Django's own backends, and `BaseAuthorizationBackend` subclasses with
+    `denies_inactive_users` set. Which backends do is decided once per configuration.
+
+    Users with their own permission checks (see `has_default_perm_checks()`) may not ask the
+    backends at all, so they are never known to have no permissions.
+    """
+    if getattr(user, 'is_active', True) or not has_default_perm_checks(user):
+        return False
+    paths = tuple(settings.AUTHENTICATION_BACKENDS)
+    try:
+        return _deny_inactive[paths]
+    except KeyError:
+        deny = _deny_inactive[paths] = all(
+            _denies_inactive_users(import_string(path)) for path in paths)
+        return deny
+
+
+def has_default_perm_checks(user):
+    """
+    Return true if ``user``'s permission checks are Django's own, which ask the backends.
+
+    This is the case for users based on `PermissionsMixin` (unless their class overrides
+    ``has_perm()`` or ``has_perms()``), and for `AnonymousUser`. Other users must be asked
+    themselves, with ``user.has_perms()``.
+    """
+    user_class = type(user)
+    try:
+        return _default_perm_checks[user_class]
+    except KeyError:
+        from django.contrib.auth.models import AnonymousUser, PermissionsMixin
+        default = _default_perm_checks[user_class] = any(
+            all(_function(getattr(user_class, name, None)) is _function(getattr(base, name))
+                for name in ['has_perm', 'has_perms'])
+            for base in [PermissionsMixin, AnonymousUser]
+        )
+        return default
+
+
+def _denies_inactive_users(backend_class):
+    """
+    Return true if ``backend_class`` is known to deny all permissions to inactive users.
+    """
+    if issubclass(backend_class, BaseAuthorizationBackend):
+        return backend_class.denies_inactive_users
+    return backend_class.__module__ == 'django.contrib.auth.backends'
+
+
+def has_perms(user, perms, obj=None, require_all=True, order_by_cost=False):
+    """
+    Return true if ``user`` has all (or with ``require_all=False``, any) of ``perms`` on ``obj``.
+
+    This agrees with ``user.has_perms(perms, obj)``, but evaluates the permissions with
+    a `PermissionEvaluator`, and stops as soon as the result is known.
+    """
+    return PermissionEvaluator(user, obj, order_by_cost).has_perms(perms, require_all)
+
+
+class PermissionEvaluator(object):
+    """
+    Evaluate a user's permissions on one object, across all authentication backends.
+
+    This works like Django's ``user.has_perm(perm, obj)``, but asks each backend at most
+    once for its permission set: backends based on `BaseAuthorizationBackend` answer
+    all permissions from one `get_all_permissions()` call. Other backends (and those
+    overriding `has_perm()`) are asked `has_perm()` for each permission.
+
+    With ``order_by_cost``, the backends are asked in order of their observed average
+    cost, instead of the order of ``AUTHENTICATION_BACKENDS``. Only use this if none of
+    the backends deny permissions by raising `PermissionDenied`: such a denial is only
+    decisive if it comes before any other backend grants the permission.
+    """
+
+    def __init__(self, user, obj=None, order_by_cost=False):
+        self.user = user
+        self.obj = obj
+        self.order_by_cost = order_by_cost
+        # Referenced from PermissionsMixin.has_perm()
+        self._is_superuser = (getattr(user, 'is_active', False) and
+                              getattr(user, 'is_superuser', False))
+        self._has_no_perms = has_no_perms(user)
+        self._backends = None
+        self._perm_sets = {}
+
+    def has_perm(self, perm):
+        """
+        Return true if the user has ``perm`` on the object.
+        """
+        # Referenced from django.contrib.auth.models._user_has_perm()
+        if self._is_superuser:
+            return True
+        if self._has_no_perms:
+            return False
+        for backend in self._get_backends():
+            try:
+                if self._backend_has_perm(backend, perm):
+                    return True
+            except PermissionDenied:
+                return False
+        return False
+
+    def has_perms(self, perms, require_all=True):
+        """
+        Return true if the user has all (or any) of ``perms`` on the object.
+        """
+        if require_all:
+            return all(self.has_perm(perm) for perm in perms)
+        else:
+            return any(self.has_perm(perm) for perm in perms)
+
+    def _get_backends(self):
+        if self._backends is None:
+            backends = [backend for backend in get_backends() if hasattr(backend, 'has_perm')]
+            if self.order_by_cost:
+                backends.sort(key=_get_average_cost)
+            self._backends = backends
+        return self._backends
+
+    def _backend_has_perm(self, backend, perm):
+        if _has_default_has_perm(backend):
+            try:
+                perms = self._perm_sets[backend]
+            except KeyError:
+                perms = self._perm_sets[backend] = self._call(
+                    backend, backend.get_all_permissions, self.user, self.obj)
+            return perm in perms
+        else:
+            return self._call(backend, backend.has_perm, self.user, perm, self.obj)
+
+    def _call(self, backend, method, *args):
+        """
+        Call a backend method, recording its cost if needed.
+        """
+        if not self.order_by_cost:
+            return method(*args)
+        start = default_timer()
+        try:
+            return method(*args)
+        finally:
+            cost = _backend_costs.setdefault(type(backend), [0.0, 0])
+            cost[0] += default_timer() - start
+            cost[1] += 1
+
+
+def _get_average_cost(backend):
+    """
+    Return the average observed cost of calls to ``backend``, or zero if it was never observed.
+    """
+    (total, calls) = _backend_costs.get(type(backend), (0.0, 0))
+    return total / calls if calls else 0.0
+
+
+def _function(method):
+    """
+    Return the function of ``method``, unwrapping Python 2's unbound methods.
+    """
+    return getattr(method, '__func__', method)
+
+
+def _has_default_has_perm(backend):
+    """
+    Return true if ``backend`` answers `has_perm()` from `get_all_permissions()`.
+    """
+    if not isinstance(backend, BaseAuthorizationBackend):
+        return False
+    return _function(type(backend).has_perm) is _base_has_perm
+
+
+_base_has_perm = _function(BaseAuthorizationBackend.has_perm)
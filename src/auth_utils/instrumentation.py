@@ -0,0 +1,185 @@
+"""
+Optional instrumentation of permission checks.
+
+Instrumentation is off until a sink is added with `add_sink()`: until then, the
+instrumented functions only pay for a check of `sinks`. Sinks are callables that
+receive an `Event` for each instrumented call or cache lookup::
+
+    stats = StatsSink()
+    with recording(stats):
+        response = view(request)
+    stats.perms['news.change_article'].calls
+"""
+import functools
+import logging
+import threading
+from collections import defaultdict, namedtuple
+from contextlib import contextmanager
+from timeit import default_timer
+
+from django.utils.functional import SimpleLazyObject
+
+#: The active sinks. Instrumentation is off while this is empty.
+sinks = []
+
+# The kinds of the instrumented calls in progress, per thread: see `calls_in_progress()`.
+_in_progress = threading.local()
+
+
+def _make_signal():
+    # django.dispatch is only imported when the signal is first used.
+    from django.dispatch import Signal
+    return Signal()
+
+
+#: Sent by `signal_sink` for each event, with the event as ``event``.
+permission_checked = SimpleLazyObject(_make_signal)
+
+
+class Event(namedtuple('Event', ['kind', 'perm', 'obj', 'backend', 'hit', 'result', 'duration'])):
+    """
+    An instrumented permission check or cache lookup.
+
+    ``kind`` names the instrumented function, like ``'backend.has_perm'`` or ``'template.perms'``,
+    or the cache, like ``'backend.cache'`` or ``'template.cache'``. ``perm`` is the permission
+    (or app label, or space-separated permissions), and ``backend`` the backend's class path.
+    Cache lookups have a ``hit``; calls have a ``result`` and a ``duration`` in seconds.
+    """
+
+
+def add_sink(sink):
+    """
+    Start sending events to ``sink``.
+    """
+    sinks.append(sink)
+
+
+def remove_sink(sink):
+    """
+    Stop sending events to ``sink``.
+    """
+    sinks.remove(sink)
+
+
+@contextmanager
+def recording(sink):
+    """
+    Send events to ``sink`` within a ``with`` block.
+    """
+    add_sink(sink)
+    try:
+        yield sink
+    finally:
+        remove_sink(sink)
+
+
+def record(kind, perm=None, obj=None, backend=None, hit=None, result=None, duration=None):
+    """
+    Send an event to the active sinks.
+    """
+    if backend is not None:
+        backend = '{}.{}'.format(type(backend).__module__, type(backend).__name__)
+    event = Event(kind, perm, obj, backend, hit, result, duration)
+    for sink in list(sinks):
+        sink(event)
+
+
+def calls_in_progress():
+    """
+    Return the kinds of the instrumented calls in progress in the current thread, outermost first.
+
+    While a call's event is recorded, this lists the calls enclosing it.
+    """
+    return tuple(getattr(_in_progress, 'kinds', ()))
+
+
+def instrumented(kind, describe):
+    """
+    Decorator: record calls of the decorated function as ``kind`` events, if instrumentation is on.
+
+    ``describe`` receives the function's arguments, and returns the event's ``perm``,
+    ``obj`` and ``backend`` as a dict.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not sinks:
+                return func(*args, **kwargs)
+            kinds = _in_progress.__dict__.setdefault('kinds', [])
+            kinds.append(kind)
+            start = default_timer()
+            try:
+                result = func(*args, **kwargs)
+            finally:
+                kinds.pop()
+            duration = default_timer() - start
+            record(kind, result=result, duration=duration, **describe(*args, **kwargs))
+            return result
+        # Let Django's template engine check the arguments of the original function.
+        wrapper._decorated_function = getattr(func, '_decorated_function', func)
+        return wrapper
+    return decorator
+
+
+class Stats(object):
+    """
+    Accumulated counts and time.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.hits = 0
+        self.misses = 0
+        self.time = 0.0
+
+    def add(self, event):
+        if event.hit is None:
+            self.calls += 1
+            self.time += event.duration or 0.0
+        elif event.hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    def __repr__(self):
+        return '<Stats calls={} hits={} misses={} time={:.6f}>'.format(
+            self.calls, self.hits, self.misses, self.time)
+
+
+class StatsSink(object):
+    """
+    Sink: accumulate `Stats` per event kind, per permission, and per backend.
+    """
+
+    def __init__(self):
+        self.kinds = defaultdict(Stats)
+        self.perms = defaultdict(Stats)
+        self.backends = defaultdict(Stats)
+
+    def __call__(self, event):
+        self.kinds[event.kind].add(event)
+        if event.perm is not None:
+            self.perms[event.perm].add(event)
+        if event.backend is not None:
+            self.backends[event.backend].add(event)
+
+
+class LoggingSink(object):
+    """
+    Sink: log each event to the ``auth_utils.instrumentation`` logger (or the given one).
+    """
+
+    def __init__(self, logger=None, level=logging.DEBUG):
+        self.logger = logger or logging.getLogger(__name__)
+        self.level = level
+
+    def __call__(self, event):
+        self.logger.log(self.level, '%s perm=%r obj=%r backend=%s hit=%s result=%s duration=%s',
+                        *event)
+
+
+def signal_sink(event):
+    """
+    Sink: send each event with the `permission_checked` signal.
+    """
+    permission_checked.send(sender=event.kind, event=event)
@@ -0,0 +1,78 @@
+"""
+Invalidation of cached permissions.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group, Permission
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.utils.module_loading import import_string
+
+from auth_utils.cache import clear_user_cache
+
+
+def invalidate_permissions(user=None, obj=None):
+    """
+    Invalidate the cached permissions of ``user`` (or all users) on ``obj`` (or all objects).
+
+    This clears the caches kept on the given user object, and calls
+    ``invalidate_cached_permissions(user, obj)`` on each configured authentication
+    backend class that provides it, such as `SharedPermissionCacheMixin` subclasses.
+
+    Backends may invalidate more than asked: for example, all of a user's objects.
+    """
+    if user is not None:
+        clear_user_cache(user)
+    for backend_class in _get_backend_classes():
+        invalidate = getattr(backend_class, 'invalidate_cached_permissions', None)
+        if invalidate is not None:
+            invalidate(user, obj)
+
+
+def _get_backend_classes():
+    """
+    Return the distinct classes of the configured authentication backends.
+    """
+    classes = []
+    for path in settings.AUTHENTICATION_BACKENDS:
+        backend_class = import_string(path)
+        if backend_class not in classes:
+            classes.append(backend_class)
+    return classes
+
+
+def connect_signals():
+    """
+    Invalidate cached permissions when users, groups, or permissions change.
+
+    This is called by `AuthUtilsConfig.ready()`.
+    """
+    User = get_user_model()
+    for model in [User, Group, Permission]:
+        post_save.connect(_saved_or_deleted, sender=model, dispatch_uid='auth_utils.invalidation')
+        post_delete.connect(_saved_or_deleted, sender=model, dispatch_uid='auth_utils.invalidation')
+    relations = [getattr(User, 'groups', None), getattr(User, 'user_permissions', None),
+                 Group.permissions]
+    for relation in relations:
+        through = getattr(relation, 'through', None)
+        if through is not None:
+            m2m_changed.connect(_m2m_changed, sender=through,
+                                dispatch_uid='auth_utils.invalidation')
+
+
+def _saved_or_deleted(sender, instance, update_fields=None, **kwargs):
+    if sender is get_user_model():
+        if update_fields is not None and set(update_fields) <= {'last_login'}:
+            return  # Logging in doesn't affect permissions.
+        invalidate_permissions(user=instance)
+    else:
+        invalidate_permissions()
+
+
+def _m2m_changed(sender, instance, action, **kwargs):
+    if action not in {'post_add', 'post_remove', 'post_clear'}:
+        return
+    if isinstance(instance, get_user_model()):
+        invalidate_permissions(user=instance)
+    else:
+        # A group or permission changed, possibly affecting many users.
+        invalidate_permissions()
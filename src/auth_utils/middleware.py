@@ -0,0 +1,56 @@
+"""
+Auth-related middleware.
+"""
+from django.conf import settings
+
+from auth_utils.budget import PermissionBudget
+
+
+class PermissionBudgetMiddleware(object):
+    """
+    Apply a `PermissionBudget` to each request.
+
+    The budget is configured with the ``AUTH_UTILS_PERMISSION_BUDGET`` setting,
+    a dict of `PermissionBudget` arguments. By default, it warns about more than
+    100 permission checks, or any repeated ones::
+
+        AUTH_UTILS_PERMISSION_BUDGET = {
+            'max_checks': 100,
+            'allow_repeats': False,
+            'action': 'warn',
+        }
+
+    The request's budget is available as ``request.permission_budget``.
+    """
+
+    default_budget = {
+        'max_checks': 100,
+        'allow_repeats': False,
+        'action': 'warn',
+    }
+
+    def __init__(self, get_response=None):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        self.process_request(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            self._finish(request)
+        return response
+
+    def process_request(self, request):
+        options = dict(self.default_budget)
+        options.update(getattr(settings, 'AUTH_UTILS_PERMISSION_BUDGET', {}))
+        request.permission_budget = PermissionBudget(**options)
+        request.permission_budget.__enter__()
+
+    def process_response(self, request, response):
+        self._finish(request)
+        return response
+
+    def _finish(self, request):
+        budget = getattr(request, 'permission_budget', None)
+        if budget is not None and budget._thread is not None:
+            budget.__exit__(None, None, None)
@@ -0,0 +1,189 @@
+"""
+Permission string helpers.
+"""
+import threading
+
+try:
+    from collections.abc import Set
+except ImportError:  # Python 2
+    from collections import Set
+
+#: The actions of Django's default model permissions.
+DEFAULT_ACTIONS = ('add', 'change', 'delete', 'view')
+
+# Upper bound on the number of memoized entries, in case models are created dynamically.
+_CACHE_SIZE = 1000
+
+_model_perms = {}
+_other_perms = {}
+
+
+def get_model_perms(model):
+    """
+    Return a mapping of `DEFAULT_ACTIONS` to their permission strings, for the given model.
+
+    ``model`` may be a model class, instance, or ``_meta`` options. The mapping is
+    computed once per model, and shared: do not modify it.
+    """
+    opts = getattr(model, '_meta', model)
+    key = (opts.app_label, opts.model_name)
+    try:
+        return _model_perms[key]
+    except KeyError:
+        if len(_model_perms) >= _CACHE_SIZE:
+            _model_perms.clear()
+        perms = {action: _format_perm(action, opts) for action in DEFAULT_ACTIONS}
+        _model_perms[key] = perms
+        return perms
+
+
+def get_perm_string(action, model):
+    """
+    Return the permission string for the given action and model, like ``'news.change_article'``.
+
+    ``model`` may be a model class, instance, or ``_meta`` options.
+    """
+    opts = getattr(model, '_meta', model)
+    try:
+        return get_model_perms(opts)[action]
+    except KeyError:
+        pass
+    key = (action, opts.app_label, opts.model_name)
+    try:
+        return _other_perms[key]
+    except KeyError:
+        if len(_other_perms) >= _CACHE_SIZE:
+            _other_perms.clear()
+        perm = _other_perms[key] = _format_perm(action, opts)
+        return perm
+
+
+def _format_perm(action, opts):
+    """
+    Format the permission string for the given action and model ``_meta`` options.
+    """
+    from django.contrib.auth import get_permission_codename
+    codename = get_permission_codename(action, opts)
+    return '{}.{}'.format(opts.app_label, codename)
+
+
+# The permission string registry of `PermissionSet`: strings are numbered in order of first use.
+# It only grows, which is fine for the bounded set of permission strings of a project.
+_perm_ids = {}
+_perm_names = []
+_intern_lock = threading.Lock()
+
+
+def intern_perm(perm):
+    """
+    Return the number of the permission string ``perm`` in the process-wide registry.
+    """
+    try:
+        return _perm_ids[perm]
+    except KeyError:
+        with _intern_lock:
+            if perm not in _perm_ids:
+                _perm_names.append(perm)
+                _perm_ids[perm] = len(_perm_names) - 1
+            return _perm_ids[perm]
+
+
+class PermissionSet(Set):
+    """
+    An immutable set of permission strings, stored as a bitset of interned permission numbers.
+
+    Membership tests, unions and intersections are integer operations, and each
+    permission takes one bit. The set compares equal to other sets of the same strings,
+    and pickles as its strings, since the numbering is specific to a process.
+    """
+
+    __slots__ = ('_bits',)
+
+    def __init__(self, perms=()):
+        if isinstance(perms, PermissionSet):
+            self._bits = perms._bits
+        else:
+            self._bits = _ids_to_bits(intern_perm(perm) for perm in perms)
+
+    @classmethod
+    def _from_bits(cls, bits):
+        perms = cls.__new__(cls)
+        perms._bits = bits
+        return perms
+
+    def __contains__(self, perm):
+        perm_id = _perm_ids.get(perm)
+        return perm_id is not None and bool(self._bits >> perm_id & 1)
+
+    def __iter__(self):
+        return iter([_perm_names[perm_id] for perm_id in _bits_to_ids(self._bits)])
+
+    def __len__(self):
+        return bin(self._bits).count('1')
+
+    def __bool__(self):
+        return self._bits != 0
+
+    __nonzero__ = __bool__
+
+    def __or__(self, other):
+        if isinstance(other, PermissionSet):
+            return self._from_bits(self._bits | other._bits)
+        return Set.__or__(self, other)
+
+    __ror__ = __or__
+
+    def __and__(self, other):
+        if isinstance(other, PermissionSet):
+            return self._from_bits(self._bits & other._bits)
+        return Set.__and__(self, other)
+
+    __rand__ = __and__
+
+    def __sub__(self, other):
+        if isinstance(other, PermissionSet):
+            return self._from_bits(self._bits & ~other._bits)
+        return Set.__sub__(self, other)
+
+    def __eq__(self, other):
+        if isinstance(other, PermissionSet):
+            return self._bits == other._bits
+        return Set.__eq__(self, other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def isdisjoint(self, other):
+        if isinstance(other, PermissionSet):
+            return not self._bits & other._bits
+        return Set.isdisjoint(self, other)
+
+    def __reduce__(self):
+        return (PermissionSet, (sorted(self),))
+
+    def __repr__(self):
+        return 'PermissionSet({!r})'.format(sorted(self))
+
+
+def _ids_to_bits(perm_ids):
+    """
+    Return the bitset of ``perm_ids``, in linear time.
+    """
+    perm_ids = list(perm_ids)
+    if not perm_ids:
+        return 0
+    digits = bytearray(b'0') * (max(perm_ids) + 1)
+    for perm_id in perm_ids:
+        digits[perm_id] = ord('1')
+    digits.reverse()
+    return int(bytes(digits), 2)
+
+
+def _bits_to_ids(bits):
+    """
+    Return the numbers in the bitset ``bits``, in linear time.
+    """
+    digits = bin(bits)[:1:-1]
+    return [perm_id for (perm_id, digit) in enumerate(digits) if digit == '1']
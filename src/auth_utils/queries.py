@@ -0,0 +1,125 @@
+"""
+Permission-based queryset helpers.
+"""
+from django.contrib.auth import get_backends
+from django.core.exceptions import PermissionDenied
+
+from auth_utils.evaluation import _has_default_has_perm, has_no_perms
+
+
+def filter_by_perm(user, perm, queryset):
+    """
+    Return ``queryset`` narrowed to the objects on which ``user`` has ``perm``.
+
+    This is the queryset equivalent of ``user.has_perm(perm, obj)``: it combines the
+    results of all configured authentication backends. Backends that provide
+    ``filter_queryset()`` (like `BaseAuthorizationBackend`) do their own filtering;
+    for other backends, the objects are checked one by one with ``has_perm()``.
+    """
+    # Referenced from PermissionsMixin.has_perm() and django.contrib.auth.models._user_has_perm()
+    if getattr(user, 'is_active', False) and getattr(user, 'is_superuser', False):
+        return queryset
+    if has_no_perms(user):
+        return queryset.none()
+    filtered = queryset.none()
+    denied_pks = set()
+    for backend in get_backends():
+        if hasattr(backend, 'filter_queryset'):
+            filtered = filtered | backend.filter_queryset(user, perm, queryset)
+        elif hasattr(backend, 'has_perm') and not _ignores_objects(backend):
+            pks = []
+            granted_pks = None
+            for obj in queryset.iterator():
+                try:
+                    if backend.has_perm(user, perm, obj):
+                        pks.append(obj.pk)
+                except PermissionDenied:
+                    # As in _user_has_perm(), a denial only counts if no earlier backend granted.
+                    if granted_pks is None:
+                        granted_pks = set(filtered.values_list('pk', flat=True))
+                    if obj.pk not in granted_pks:
+                        denied_pks.add(obj.pk)
+            filtered = filtered | queryset.filter(pk__in=pks)
+    if denied_pks:
+        filtered = filtered.exclude(pk__in=denied_pks)
+    return filtered
+
+
+def has_perms_bulk(user, checks):
+    """
+    Answer many ``user.has_perm(perm, obj)`` questions at once.
+
+    ``checks`` is an iterable of ``(perm, obj)`` pairs; the result maps each pair to
+    a boolean. `BaseAuthorizationBackend` subclasses are asked once for all the objects,
+    with ``get_all_permissions_bulk()``; if they override ``has_perm()``, they are asked
+    once per permission instead, with ``has_perm_bulk()``. Other backends are asked one
+    question at a time. The objects must be hashable.
+    """
+    checks = list(checks)
+    if getattr(user, 'is_active', False) and getattr(user, 'is_superuser', False):
+        return dict.fromkeys(checks, True)
+    results = dict.fromkeys(checks, False)
+    if has_no_perms(user):
+        return results
+    denied = set()
+    for backend in get_backends():
+        # As in _user_has_perm(), the first backend to grant or deny a permission decides it.
+        pending = [(perm, obj) for (perm, obj) in results
+                   if not results[perm, obj] and (perm, obj) not in denied]
+        if not pending:
+            break
+        if _has_default_has_perm(backend):
+            objs = list(_unique(obj for (perm, obj) in pending))
+            all_perms = backend.get_all_permissions_bulk(user, objs)
+            for (perm, obj) in pending:
+                if perm in all_perms[obj]:
+                    results[perm, obj] = True
+        elif hasattr(backend, 'has_perm_bulk'):
+            objs_by_perm = {}
+            for (perm, obj) in pending:
+                objs_by_perm.setdefault(perm, []).append(obj)
+            for (perm, objs) in objs_by_perm.items():
+                try:
+                    permitted = backend.has_perm_bulk(user, perm, objs)
+                except PermissionDenied:
+                    # Find out which objects are denied.
+                    _check_each(backend, user, [(perm, obj) for obj in objs], results, denied)
+                    continue
+                for obj in objs:
+                    if permitted[obj]:
+                        results[perm, obj] = True
+        elif hasattr(backend, 'has_perm'):
+            _check_each(backend, user, pending, results, denied)
+    return results
+
+
+def _check_each(backend, user, checks, results, denied):
+    """
+    Ask ``backend.has_perm()`` each of ``checks``, recording the granted and denied ones.
+    """
+    for (perm, obj) in checks:
+        if obj is not None and _ignores_objects(backend):
+            continue
+        try:
+            if backend.has_perm(user, perm, obj):
+                results[perm, obj] = True
+        except PermissionDenied:
+            denied.add((perm, obj))
+
+
+def _unique(items):
+    """
+    Yield the distinct ``items``, in order.
+    """
+    seen = set()
+    for item in items:
+        if item not in seen:
+            seen.add(item)
+            yield item
+
+
+def _ignores_objects(backend):
+    """
+    Return true if ``backend`` is one of Django's own backends: they never grant object permissions.
+    """
+    return type(backend).__module__ == 'django.contrib.auth.backends'
@@ -0,0 +1,158 @@
+"""
+Role hierarchies, with precomputed permissions.
+"""
+import threading
+
+from auth_utils.backends import BaseAuthorizationBackend
+
+
+class RoleHierarchy(object):
+    """
+    Named roles, each with its own permissions, and the roles it includes.
+
+    A role has the permissions of all the roles it includes, transitively. These are
+    precomputed: `get_permissions()` is a dictionary lookup, and changing a role only
+    recomputes the roles that include it. Changes are serialized by a lock, and
+    published atomically, so lookups need no locking.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._perms = {}
+        self._includes = {}
+        self._included_by = {}
+        self._closure = {}
+
+    def add_role(self, role, perms=(), includes=()):
+        """
+        Add ``role``, or replace its definition.
+
+        The included roles must exist, and must not include ``role`` themselves.
+        """
+        includes = frozenset(includes)
+        with self._lock:
+            for included in includes:
+                if included not in self._perms:
+                    raise ValueError('Unknown role: {!r}'.format(included))
+                if included == role or role in self._get_included(included):
+                    raise ValueError('Role cycle: {!r} includes {!r}'.format(included, role))
+            for included in self._includes.get(role, ()):
+                self._included_by[included].discard(role)
+            for included in includes:
+                self._included_by[included].add(role)
+            self._perms[role] = frozenset(perms)
+            self._includes[role] = includes
+            self._included_by.setdefault(role, set())
+            self._update_closure(role)
+
+    def remove_role(self, role):
+        """
+        Remove ``role``. The roles that included it lose its permissions.
+        """
+        with self._lock:
+            including = self._included_by.pop(role)
+            for included in self._includes.pop(role):
+                self._included_by[included].discard(role)
+            del self._perms[role]
+            for other in including:
+                self._includes[other] = self._includes[other] - {role}
+            self._update_closure(*including, removed=role)
+
+    def get_permissions(self, role):
+        """
+        Return the permissions of ``role``, including those of the roles it includes.
+        """
+        return self._closure.get(role, frozenset())
+
+    def get_roles_permissions(self, roles):
+        """
+        Return the combined permissions of ``roles``.
+        """
+        closure = self._closure
+        perms = set()
+        for role in roles:
+            perms.update(closure.get(role, ()))
+        return perms
+
+    def _get_included(self, role):
+        """
+        Return the roles that ``role`` includes, transitively.
+        """
+        return self._walk(role, self._includes)
+
+    def _get_including(self, role):
+        """
+        Return the roles that include ``role``, transitively.
+        """
+        return self._walk(role, self._included_by)
+
+    @staticmethod
+    def _walk(role, edges):
+        found = set()
+        pending = list(edges.get(role, ()))
+        while pending:
+            other = pending.pop()
+            if other not in found:
+                found.add(other)
+                pending.extend(edges.get(other, ()))
+        return found
+
+    def _update_closure(self, *roles, **kwargs):
+        """
+        Recompute the permissions of ``roles`` and the roles that include them, and publish them.
+
+        With ``removed``, also drop that role's permissions, in the same update.
+        """
+        removed = kwargs.pop('removed', None)
+        affected = set(roles)
+        for role in roles:
+            affected |= self._get_including(role)
+        closure = dict(self._closure)
+        closure.pop(removed, None)
+        for other in affected:
+            closure.pop(other, None)
+
+        def compute(other):
+            try:
+                return closure[other]
+            except KeyError:
+                perms = set(self._perms[other])
+                for included in self._includes[other]:
+                    perms.update(compute(included))
+                perms = closure[other] = frozenset(perms)
+                return perms
+
+        for other in affected:
+            compute(other)
+        self._closure = closure
+
+
+class RoleHierarchyBackend(BaseAuthorizationBackend):
+    """
+    Authorization backend granting the permissions of a user's roles in a `RoleHierarchy`.
+
+    Subclasses set `hierarchy` and implement `get_user_roles()`::
+
+        class StaffRoles(RoleHierarchyBackend):
+            hierarchy = staff_roles
+
+            def get_user_roles(self, user_obj, obj=None):
+                return user_obj.role_names
+    """
+
+    #: The `RoleHierarchy` to look up roles in.
+    hierarchy = None
+
+    def get_user_roles(self, user_obj, obj=None):
+        """
+        Return the names of ``user_obj``'s roles, globally or for ``obj``.
+
+        Override this in subclasses.
+        """
+        return ()
+
+    def get_group_permissions(self, user_obj, obj=None):
+        """
+        Return the combined permissions of `get_user_roles()`.
+        """
+        return self.hierarchy.get_roles_permissions(self.get_user_roles(user_obj, obj))
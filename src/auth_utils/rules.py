@@ -0,0 +1,117 @@
+"""
+Rule-based authorization: permissions granted by predicates.
+"""
+from collections import namedtuple
+
+from auth_utils.backends import BaseAuthorizationBackend
+from auth_utils.instrumentation import instrumented
+
+
+class Rule(namedtuple('Rule', ['predicate', 'filter'])):
+    """
+    A rule granting a permission: ``predicate(user, obj)`` decides whether it applies.
+
+    The optional ``filter(user, queryset)`` is the queryset form of the predicate:
+    it returns the objects of ``queryset`` for which the predicate is true.
+    """
+
+
+class RuleRegistry(object):
+    """
+    Rules, registered per permission string.
+
+    The rules of each permission are kept in a dispatch table, so checking a permission
+    only evaluates its own rules. A permission is granted if any of its rules applies.
+    """
+
+    def __init__(self):
+        self._rules = {}
+
+    def add_rule(self, perm, predicate, filter=None):
+        """
+        Register a rule granting ``perm`` when ``predicate(user, obj)`` is true.
+        """
+        self._rules[perm] = self._rules.get(perm, ()) + (Rule(predicate, filter),)
+
+    def rule(self, perm, filter=None):
+        """
+        Decorator version of `add_rule()`::
+
+            @rules.rule('news.change_article', filter=lambda user, qs: qs.filter(author=user))
+            def is_author(user, article):
+                return article is not None and article.author_id == user.pk
+        """
+        def decorator(predicate):
+            self.add_rule(perm, predicate, filter)
+            return predicate
+        return decorator
+
+    def get_rules(self, perm):
+        """
+        Return the rules of ``perm``, as a tuple.
+        """
+        return self._rules.get(perm, ())
+
+    def get_perms(self):
+        """
+        Return the permissions that have rules.
+        """
+        return set(self._rules)
+
+
+class RuleBackend(BaseAuthorizationBackend):
+    """
+    Authorization backend granting permissions according to the rules in a `RuleRegistry`.
+
+    `has_perm()` evaluates only the rules of the checked permission. `get_user_permissions()`
+    evaluates all of them, and so agrees with `has_perm()` for `get_all_permissions()`
+    and the bulk methods.
+    """
+
+    #: The `RuleRegistry` to evaluate.
+    rules = None
+
+    def get_user_permissions(self, user_obj, obj=None):
+        """
+        Return the permissions that have a rule applying to ``user_obj`` and ``obj``.
+        """
+        return {perm for perm in self.rules.get_perms()
+                if self._check_rules(user_obj, perm, obj)}
+
+    @instrumented('backend.has_perm',
+                  lambda self, user_obj, perm, obj=None: dict(perm=perm, obj=obj, backend=self))
+    def has_perm(self, user_obj, perm, obj=None):
+        """
+        Evaluate the rules of ``perm``.
+        """
+        if not user_obj.is_active:
+            return False
+        return self._check_rules(user_obj, perm, obj)
+
+    def has_perm_bulk(self, user_obj, perm, objs):
+        """
+        Evaluate the rules of ``perm`` for each of ``objs``.
+        """
+        return {obj: self.has_perm(user_obj, perm, obj) for obj in objs}
+
+    def filter_queryset(self, user_obj, perm, queryset):
+        """
+        Combine the rules' queryset filters, if all the rules of ``perm`` have one.
+
+        Otherwise, the objects are checked with `has_perm_bulk()`.
+        """
+        rules = self.rules.get_rules(perm)
+        if not user_obj.is_active or not rules:
+            return queryset.none()
+        if not all(rule.filter is not None for rule in rules):
+            return super(RuleBackend, self).filter_queryset(user_obj, perm, queryset)
+        filtered = queryset.none()
+        for rule in rules:
+            filtered = filtered | rule.filter(user_obj, queryset)
+        return filtered
+
+    def _check_rules(self, user_obj, perm, obj):
+        for rule in self.rules.get_rules(perm):
+            if rule.predicate(user_obj, obj):
+                return True
+        return False
@@ -1,14 +1,27 @@
 """
 Auth-related template helpers.
 """
-from attr import attributes, attr
-
 from django import template
-from django.contrib.auth import get_permission_codename
+from django.template.base import FilterExpression, Variable, VariableDoesNotExist, VariableNode
+from django.template.defaulttags import ForNode, IfNode
+
+from auth_utils import instrumentation
+from auth_utils.cache import get_object_key, get_user_cache
+from auth_utils.evaluation import has_default_perm_checks, has_no_perms
+from auth_utils.instrumentation import instrumented
+from auth_utils.perms import get_model_perms, get_perm_string
+from auth_utils.queries import has_perms_bulk
 
 register = template.Library()
 
 
+def _describe_model_perm(action):
+    """
+    Describe a ``can_*`` filter call for `instrumented`.
+    """
+    return lambda user, obj: dict(perm=get_model_perms(obj)[action], obj=obj)
+
+
 @register.filter
 def perms(user, obj=None):
     """
@@ -18,46 +31,384 @@ def perms(user, obj=None):
     ``user.has_perm(perm, obj)``, using the following syntax::
 
         {% if perm in user|perms:obj %}
+
+    The checker's results are memoized on the user object: see `_has_perm()`.
     """
     return PermChecker(user, obj)
 
 
-@attributes
 class PermChecker(object):
     """
     Permission-checking helper.
 
     This is similar to `django.contrib.auth.context_processors.PermWrapper`,
-    but supports object permissions.
+    but supports object permissions. Like `PermWrapper`, it also supports lookups
+    by app label and codename, such as ``article_perms.news.change_article``.
     """
-    user = attr()
-    obj = attr()
 
+    __slots__ = ('user', 'obj')
+
+    def __init__(self, user, obj):
+        self.user = user
+        self.obj = obj
+
+    def __repr__(self):
+        return 'PermChecker(user={!r}, obj={!r})'.format(self.user, self.obj)
+
+    def __eq__(self, other):
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return (self.user, self.obj) == (other.user, other.obj)
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    __hash__ = None
+
+    @instrumented('template.perms', lambda self, perm: dict(perm=perm, obj=self.obj))
     def __contains__(self, perm):
-        return self.user.has_perm(perm, self.obj)
+        return _has_perm(self.user, perm, self.obj)
+
+    def __getitem__(self, app_label):
+        return AppPermChecker(self, app_label)
+
+    def __iter__(self):
+        # Without this, __getitem__ would make the checker look iterable.
+        raise TypeError('PermChecker is not iterable.')
+
+
+class AppPermChecker(object):
+    """
+    Permission-checking helper for one app, returned by ``PermChecker[app_label]``.
+
+    Looking up a codename checks the permission, and the helper is true if the user has
+    any permissions in the app (as with ``user.has_module_perms(app_label)``).
+    """
+
+    __slots__ = ('checker', 'app_label')
+
+    def __init__(self, checker, app_label):
+        self.checker = checker
+        self.app_label = app_label
+
+    def __repr__(self):
+        return 'AppPermChecker({!r}, {!r})'.format(self.checker, self.app_label)
+
+    def __getitem__(self, codename):
+        return '{}.{}'.format(self.app_label, codename) in self.checker
+
+    def __contains__(self, codename):
+        return self[codename]
+
+    def __iter__(self):
+        raise TypeError('AppPermChecker is not iterable.')
+
+    def __bool__(self):
+        user = self.checker.user
+        return not has_no_perms(user) and user.has_module_perms(self.app_label)
+
+    __nonzero__ = __bool__
 
 
 @register.filter
+@instrumented('template.can_change', _describe_model_perm('change'))
 def can_change(user, obj):
     """
     Shortcut for checking if the user has permission to change the given object.
     """
-    perm = _get_perm_string('change', obj._meta)
-    return user.has_perm(perm, obj)
+    return _has_perm(user, get_model_perms(obj)['change'], obj)
 
 
 @register.filter
+@instrumented('template.can_delete', _describe_model_perm('delete'))
 def can_delete(user, obj):
     """
     Shortcut for checking if the user has permission to delete the given object.
     """
-    perm = _get_perm_string('delete', obj._meta)
-    return user.has_perm(perm, obj)
+    return _has_perm(user, get_model_perms(obj)['delete'], obj)
+
+
+@register.filter
+@instrumented('template.can_view', _describe_model_perm('view'))
+def can_view(user, obj):
+    """
+    Shortcut for checking if the user has permission to view the given object.
+    """
+    return _has_perm(user, get_model_perms(obj)['view'], obj)
+
+
+@register.filter
+@instrumented('template.can_add', _describe_model_perm('add'))
+def can_add(user, obj):
+    """
+    Shortcut for checking if the user has the add permission of the given object's model.
+    """
+    return _has_perm(user, get_model_perms(obj)['add'], obj)
+
+
+@register.simple_tag
+def prefetch_perms(user, objs, *perms):
+    """
+    Check the user's permissions on a list of objects in advance, with batched backend calls.
+
+    Each permission is either a full permission string, or an action like ``"change"``,
+    which is expanded to the model permission of each object, as in `can_change`::
+
+        {% prefetch_perms user object_list "change" "delete" "news.publish_article" %}
+
+    The results are memoized for the `perms` and ``can_*`` filters.
+    """
+    _prefetch(user, [(perm if '.' in perm else get_perm_string(perm, obj), obj)
+                     for obj in objs for perm in perms])
+    return ''
+
+
+@register.tag
+def authblock(parser, token):
+    """
+    Check the permissions used in a block in advance, with batched backend calls.
 
+    The block is analyzed when the template is compiled, for uses of the `perms` and
+    ``can_*`` filters on the given user, such as::
 
-def _get_perm_string(action, opts):
+        {% authblock user %}
+        {% for article in article_list %}
+            {% if user|can_change:article %} <a href="...">Edit</a> {% endif %}
+            {% if 'news.publish_article' in user|perms:article %} Publish {% endif %}
+        {% endfor %}
+        {% endauthblock %}
+
+    When the block is rendered, these checks are done like `prefetch_perms`, including those
+    on the items of ``{% for %}`` loops. Only literal permission strings are found, and loop
+    sequences are resolved once in advance, so sequences that make new querysets (such as
+    ``article.comments.all``) are queried twice.
+    """
+    bits = token.split_contents()
+    if len(bits) != 2:
+        raise template.TemplateSyntaxError('{} takes a single user argument'.format(bits[0]))
+    user = parser.compile_filter(bits[1])
+    nodelist = parser.parse(('endauthblock',))
+    parser.delete_first_token()
+    return AuthBlockNode(user, nodelist)
+
+
+class AuthBlockNode(template.Node):
+    """
+    See `authblock`.
+    """
+
+    def __init__(self, user, nodelist):
+        self.user = user
+        self.nodelist = nodelist
+        self.uses = list(_find_perm_uses(nodelist, str(user.var), ()))
+
+    def render(self, context):
+        user = self.user.resolve(context)
+        checks = []
+        for (perm, action, obj_var, loops) in self.uses:
+            for obj in _resolve_in_loops(context, obj_var, loops):
+                if action is not None:
+                    if not hasattr(obj, '_meta'):
+                        continue
+                    perm = get_model_perms(obj)[action]
+                checks.append((perm, obj))
+        _prefetch(user, checks)
+        return self.nodelist.render(context)
+
+
+def _prefetch(user, checks):
+    """
+    Memoize the results of the ``(perm, obj)`` pairs in ``checks`` that aren't yet, in one batch.
+
+    Users with their own permission checks (see `has_default_perm_checks()`) are skipped:
+    the filters ask them instead. So are values that aren't users at all, such as the empty
+    string of a missing template variable.
+    """
+    if not hasattr(user, 'is_active') or not has_default_perm_checks(user) or has_no_perms(user):
+        return
+    results = get_user_cache(user, _RESULTS)
+    pending = set()
+    for (perm, obj) in checks:
+        try:
+            if (perm, get_object_key(obj)) not in results:
+                pending.add((perm, obj))
+        except TypeError:
+            pass
+    for ((perm, obj), result) in has_perms_bulk(user, pending).items():
+        results[perm, get_object_key(obj)] = result
+
+
+_ACTION_FILTERS = {
+    can_change: 'change',
+    can_delete: 'delete',
+    can_view: 'view',
+    can_add: 'add',
+}
+
+
+def _find_perm_uses(nodelist, user_name, loops):
+    """
+    Yield the permission checks on ``user_name`` in ``nodelist``.
+
+    Each check is a tuple ``(perm, action, obj_var, loops)``: either ``perm`` or the model
+    ``action`` is given, and ``loops`` are the enclosing ``(loopvars, sequence)`` pairs.
+    """
+    for node in nodelist:
+        if isinstance(node, IfNode):
+            for (condition, branch) in node.conditions_nodelists:
+                for use in _find_condition_uses(condition, user_name, loops):
+                    yield use
+                for use in _find_perm_uses(branch, user_name, loops):
+                    yield use
+            continue
+        expressions = list(getattr(node, 'extra_context', {}).values())
+        if isinstance(node, VariableNode):
+            expressions.append(node.filter_expression)
+        for expression in expressions:
+            use = _get_action_use(expression, user_name, loops)
+            if use is not None:
+                yield use
+        child_loops = loops
+        if isinstance(node, ForNode):
+            child_loops = loops + ((tuple(node.loopvars), node.sequence),)
+        for name in getattr(node, 'child_nodelists', ()):
+            child = getattr(node, name, None)
+            if child:
+                for use in _find_perm_uses(child, user_name, child_loops):
+                    yield use
+
+
+def _find_condition_uses(condition, user_name, loops):
+    """
+    Yield the permission checks in an ``{% if %}`` condition.
+    """
+    if condition is None:
+        return
+    expression = getattr(condition, 'value', None)
+    if isinstance(expression, FilterExpression):
+        use = _get_action_use(expression, user_name, loops)
+        if use is not None:
+            yield use
+        return
+    if getattr(condition, 'id', None) in {'in', 'not in'}:
+        perm = getattr(condition.first, 'value', None)
+        checker = getattr(condition.second, 'value', None)
+        if (isinstance(perm, FilterExpression) and isinstance(perm.var, type(u'')) and
+                not perm.filters and isinstance(checker, FilterExpression)):
+            obj_var = _get_filter_arg(checker, user_name, perms)
+            if obj_var is not None:
+                yield (perm.var, None, obj_var, loops)
+                return
+    for operand in [condition.first, condition.second]:
+        if operand is not None:
+            for use in _find_condition_uses(operand, user_name, loops):
+                yield use
+
+
+def _get_action_use(expression, user_name, loops):
+    """
+    Return the check of a ``user|can_*:obj`` expression, or `None`.
+    """
+    if not expression.filters:
+        return None
+    action = _ACTION_FILTERS.get(expression.filters[0][0])
+    if action is None:
+        return None
+    obj_var = _get_filter_arg(expression, user_name, expression.filters[0][0])
+    return None if obj_var is None else (None, action, obj_var, loops)
+
+
+def _get_filter_arg(expression, user_name, func):
+    """
+    Return the argument of ``user|func:obj`` in ``expression``, or `None`.
+
+    A missing argument (as in ``user|perms``) is returned as a `Variable` of `None`.
+    """
+    if (not isinstance(expression.var, Variable) or str(expression.var) != user_name or
+            not expression.filters or expression.filters[0][0] is not func):
+        return None
+    args = expression.filters[0][1]
+    if not args:
+        return Variable('None')
+    (lookup, arg) = args[0]
+    return arg if lookup else None
+
+
+def _resolve_in_loops(context, var, loops):
+    """
+    Return the values of ``var`` in ``context``, for each iteration of the loops it depends on.
     """
-    Return the permission string for the given action and model ``_meta`` options.
+    names = {var.var.split('.')[0]}
+    needed = []
+    for (loopvars, sequence) in reversed(loops):
+        if names.intersection(loopvars):
+            if len(loopvars) != 1:
+                return []  # Unpacking loops are not supported.
+            needed.append((loopvars[0], sequence))
+            names.difference_update(loopvars)
+            names.update(_get_root_names(sequence))
+    needed.reverse()
+    values = []
+    _resolve_loop_values(context, var, needed, values)
+    return values
+
+
+def _resolve_loop_values(context, var, loops, values):
+    if not loops:
+        try:
+            values.append(var.resolve(context))
+        except VariableDoesNotExist:
+            pass
+        return
+    ((loopvar, sequence), inner_loops) = (loops[0], loops[1:])
+    items = sequence.resolve(context, ignore_failures=True)
+    if not (hasattr(items, '__len__') or hasattr(items, '__getitem__')):
+        # Skip missing sequences, and iterators: the loop itself must be able to consume them.
+        return
+    for item in items:
+        context.push({loopvar: item})
+        try:
+            _resolve_loop_values(context, var, inner_loops, values)
+        finally:
+            context.pop()
+
+
+def _get_root_names(expression):
+    """
+    Return the names of the context variables used by ``expression``.
+    """
+    variables = [expression.var] + [arg for (_, args) in expression.filters
+                                    for (lookup, arg) in args if lookup]
+    return {variable.var.split('.')[0] for variable in variables if isinstance(variable, Variable)}
+
+
+# Namespace of the template helpers' cache on the user object.
+_RESULTS = 'auth_utils.templatetags.results'
+
+
+def _has_perm(user, perm, obj):
+    """
+    Return ``user.has_perm(perm, obj)``, memoized on the user object.
+
+    Like Django's own permission caches, the results live as long as the user object:
+    for ``request.user``, the rest of the request. To see permission changes made during
+    the request, clear them with `auth_utils.cache.clear_user_cache()`.
+    Users without any permissions (see `has_no_perms()`) are denied without asking the backends.
     """
-    codename = get_permission_codename(action, opts)
-    return '{}.{}'.format(opts.app_label, codename)
+    if has_no_perms(user):
+        return False
+    try:
+        key = (perm, get_object_key(obj))
+        results = get_user_cache(user, _RESULTS)
+        result = results[key]
+    except TypeError:
+        return user.has_perm(perm, obj)
+    except KeyError:
+        result = results[key] = user.has_perm(perm, obj)
+        hit = False
+    else:
+        hit = True
+    if instrumentation.sinks:
+        instrumentation.record('template.cache', perm=perm, obj=obj, hit=hit)
+    return result
@@ -1,16 +1,73 @@
 """
 Auth-related view utils.
 """
+import django
 from django.views.generic.detail import SingleObjectMixin
-from auth_utils.django18_compat import PermissionRequiredMixin
+from auth_utils.evaluation import has_default_perm_checks, has_no_perms, has_perms
+from auth_utils.instrumentation import instrumented
+
+if (1, 9) <= django.VERSION:
+    from django.contrib.auth.mixins import PermissionRequiredMixin as _PermissionRequiredMixin
+else:
+    # Only load the compatibility copy where it's needed.
+    from auth_utils.django18_compat import PermissionRequiredMixin as _PermissionRequiredMixin
+
+
+class PermissionRequiredMixin(_PermissionRequiredMixin):
+    """
+    Like Django's `PermissionRequiredMixin`, but evaluate the permissions with `has_perms()`.
+
+    Each authentication backend computes its permissions once for all of ``permission_required``,
+    and the check stops at the first missing permission. Users with their own permission checks
+    (see `has_default_perm_checks()`) are asked ``user.has_perms()`` instead.
+    """
+
+    #: Require all of the permissions (the default), or any one of them.
+    permission_require_all = True
+
+    #: Ask the authentication backends in order of observed cost: see `PermissionEvaluator`.
+    permission_order_by_cost = False
+
+    def has_permission(self):
+        return self.check_permissions(None)
+
+    @instrumented('view.has_permission', lambda self, obj: dict(
+        perm=' '.join(self.get_permission_required()), obj=obj))
+    def check_permissions(self, obj):
+        """
+        Return true if the user has the required permissions on ``obj``.
+        """
+        user = self.request.user
+        perms = self.get_permission_required()
+        if not has_default_perm_checks(user):
+            if self.permission_require_all:
+                return user.has_perms(perms, obj)
+            return any(user.has_perms([perm], obj) for perm in perms)
+        return has_perms(
+            user, perms, obj,
+            require_all=self.permission_require_all,
+            order_by_cost=self.permission_order_by_cost,
+        )
 
 
 class ObjectPermissionRequiredMixin(PermissionRequiredMixin, SingleObjectMixin):
     """
     Like `PermissionRequiredMixin`, but check the permission against `SingleObjectMixin`'s object.
+
+    The object is fetched once per request: the permission check stores it as ``self.object``,
+    and later `get_object()` calls (such as `DetailView.get()`'s) return it again.
+    Users without any permissions (see `has_no_perms()`) are denied without fetching the object.
     """
 
     def has_permission(self):
-        perms = self.get_permission_required()
-        obj = self.get_object()
-        return self.request.user.has_perms(perms, obj)
+        if has_no_perms(self.request.user):
+            return False
+        return self.check_permissions(self.get_object())
+
+    def get_object(self, queryset=None):
+        if queryset is None and hasattr(self, '_permission_object'):
+            return self._permission_object
+        obj = super(ObjectPermissionRequiredMixin, self).get_object(queryset)
+        if queryset is None:
+            self.object = self._permission_object = obj
+        return obj
@@ -0,0 +1,13 @@
+import sys
+
+collect_ignore = []
+if sys.version_info < (3, 5):
+    # These use async syntax.
+    collect_ignore.append('test_async_backends.py')
+
+try:
+    from django.db.models import QuerySet
+    QuerySet.aget
+except AttributeError:
+    # These need Django 4.1+'s async ORM interface.
+    collect_ignore.append('test_async_views.py')
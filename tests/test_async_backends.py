@@ -0,0 +1,168 @@
+import asyncio
+from unittest import TestCase
+
+from django.test import SimpleTestCase, override_settings
+
+from mock_compat import NonCallableMock
+
+from auth_utils.backends import BaseAuthorizationBackend
+from test_backend import (
+    CountingAuthorizationBackend, CustomAuthorizationBackend, LazyAuthorizationBackend,
+)
+from test_cache import SharedBackend
+
+
+def run(coroutine):
+    return asyncio.new_event_loop().run_until_complete(coroutine)
+
+
+class TestAsyncDefaults(TestCase):
+    """
+    The async methods agree with the sync methods by default.
+    """
+
+    def setUp(self):
+        self.backend = CustomAuthorizationBackend()
+        self.active_user = NonCallableMock(spec=[], is_active=True)
+        self.inactive_user = NonCallableMock(spec=[], is_active=False)
+
+    def test_get_permissions(self):
+        for user in [self.active_user, self.inactive_user]:
+            for obj in [None, object()]:
+                assert (run(self.backend.aget_user_permissions(user, obj)) ==
+                        self.backend.get_user_permissions(user, obj))
+                assert (run(self.backend.aget_group_permissions(user, obj)) ==
+                        self.backend.get_group_permissions(user, obj))
+                assert (run(self.backend.aget_all_permissions(user, obj)) ==
+                        self.backend.get_all_permissions(user, obj))
+
+    def test_has_perm(self):
+        for user in [self.active_user, self.inactive_user]:
+            for perm in ['custom.user_active_none', 'custom.group_active_obj', 'custom.decoy']:
+                for obj in [None, object()]:
+                    assert (run(self.backend.ahas_perm(user, perm, obj)) ==
+                            self.backend.has_perm(user, perm, obj))
+
+    def test_has_module_perms(self):
+        for user in [self.active_user, self.inactive_user]:
+            for app_label in ['custom', 'decoy']:
+                assert (run(self.backend.ahas_module_perms(user, app_label)) ==
+                        self.backend.has_module_perms(user, app_label))
+
+    def test_lazy_has_perm(self):
+        backend = LazyAuthorizationBackend()
+        assert run(backend.ahas_perm(self.active_user, 'custom.user_active_none')) is True
+        assert backend.calls == [('user', None)]
+
+    def test_overridden_sync_methods(self):
+        """
+        Overridden sync permission checks are used by their async counterparts.
+        """
+        class OwnerBackend(BaseAuthorizationBackend):
+
+            def has_perm(self, user_obj, perm, obj=None):
+                return getattr(obj, 'owner', None) is user_obj
+
+            def has_module_perms(self, user_obj, app_label):
+                return app_label == 'owned'
+
+        backend = OwnerBackend()
+        obj = NonCallableMock(spec=[], owner=self.active_user)
+        assert run(backend.ahas_perm(self.active_user, 'custom.change_obj', obj)) is True
+        assert run(backend.ahas_perm(self.active_user, 'custom.change_obj', object())) is False
+        assert run(backend.ahas_module_perms(self.active_user, 'owned')) is True
+        assert run(backend.ahas_module_perms(self.active_user, 'custom')) is False
+
+    def test_overridden_permission_sets(self):
+        """
+        Overridden sync permission sets are used by the async methods.
+        """
+        archived = object()
+
+        class ArchivedGetAll(CustomAuthorizationBackend):
+            def get_all_permissions(self, user_obj, obj=None):
+                perms = super(ArchivedGetAll, self).get_all_permissions(user_obj, obj)
+                return perms - {'custom.user_active_obj'} if obj is archived else perms
+
+        class ArchivedCompute(CountingAuthorizationBackend):
+            def compute_all_permissions(self, user_obj, obj=None):
+                perms = super(ArchivedCompute, self).compute_all_permissions(user_obj, obj)
+                return perms - {'custom.user_active_obj'} if obj is archived else perms
+
+        for backend in [ArchivedGetAll(), ArchivedCompute()]:
+            for obj in [archived, object()]:
+                assert (run(backend.aget_all_permissions(self.active_user, obj)) ==
+                        backend.get_all_permissions(self.active_user, obj))
+                assert (run(backend.ahas_perm(self.active_user, 'custom.user_active_obj', obj)) ==
+                        backend.has_perm(self.active_user, 'custom.user_active_obj', obj))
+
+    def test_cache_shared(self):
+        """
+        The async methods share the sync methods' cache.
+        """
+        backend = CountingAuthorizationBackend()
+        obj = object()
+        assert run(backend.ahas_perm(self.active_user, 'custom.user_active_obj', obj)) is True
+        assert backend.has_perm(self.active_user, 'custom.user_active_obj', obj) is True
+        assert run(backend.ahas_module_perms(self.active_user, 'custom')) is True
+        assert backend.has_module_perms(self.active_user, 'custom') is True
+        assert sorted(backend.calls, key=repr) == sorted(
+            [('user', obj), ('group', obj), ('user', None), ('group', None)], key=repr)
+
+
+class ConcurrentBackend(BaseAuthorizationBackend):
+    """
+    Truly async lookups, recording how many run at once.
+    """
+
+    def __init__(self):
+        self.running = 0
+        self.max_running = 0
+
+    async def _lookup(self, perm):
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        await asyncio.sleep(0.01)
+        self.running -= 1
+        return {perm}
+
+    async def aget_user_permissions(self, user_obj, obj=None):
+        return await self._lookup('custom.user')
+
+    async def aget_group_permissions(self, user_obj, obj=None):
+        return await self._lookup('custom.group')
+
+
+class TestAsyncOverrides(TestCase):
+    """
+    Overridden async lookups.
+    """
+
+    def test_concurrent(self):
+        """
+        User and group permissions are looked up concurrently.
+        """
+        backend = ConcurrentBackend()
+        user = NonCallableMock(spec=[], is_active=True)
+        assert run(backend.aget_all_permissions(user)) == {'custom.user', 'custom.group'}
+        assert backend.max_running == 2
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'shared': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'async'},
+})
+class TestAsyncSharedPermissionCache(SimpleTestCase):
+    """
+    The async methods use `SharedPermissionCacheMixin`'s cache.
+    """
+
+    def setUp(self):
+        del SharedBackend.calls[:]
+
+    def test_shared(self):
+        user = NonCallableMock(spec=[], pk=1, is_active=True)
+        assert run(SharedBackend().ahas_perm(user, 'custom.perm')) is True
+        assert SharedBackend().has_perm(user, 'custom.perm') is True
+        assert run(SharedBackend().ahas_perm(user, 'custom.perm')) is True
+        assert SharedBackend.calls == [None]
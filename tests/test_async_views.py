@@ -0,0 +1,84 @@
+import asyncio
+
+from django.contrib.auth.models import Group
+from django.core.exceptions import PermissionDenied
+from django.http import Http404, HttpResponse
+from django.test import RequestFactory, TestCase
+from django.views.generic import View
+
+from mock_compat import NonCallableMock
+
+from auth_utils.async_views import AsyncObjectPermissionRequiredMixin
+
+
+class GroupView(AsyncObjectPermissionRequiredMixin, View):
+    """
+    Stub async object-permission-protected view.
+    """
+    model = Group
+    permission_required = ['auth.view_group', 'auth.change_group']
+    raise_exception = True
+
+    async def get(self, request, *args, **kwargs):
+        # The object was fetched by the permission check: this doesn't query the database.
+        assert self.get_object() is self.object
+        return HttpResponse('Permitted!')
+
+
+class TestAsyncObjectPermissionRequiredMixin(TestCase):
+    """
+    Test `AsyncObjectPermissionRequiredMixin` via GroupView.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.group = Group.objects.create(name='group')
+
+    def setUp(self):
+        self.view = GroupView.as_view()
+        self.checked = []
+
+    def _request(self, user):
+        request = RequestFactory().get('/')
+        request.user = user
+        return request
+
+    def _user(self, delays):
+        """
+        A user with the given permissions, answering after the given delays.
+        """
+        async def ahas_perm(perm, obj=None):
+            assert obj == self.group
+            granted, delay = delays[perm]
+            await asyncio.sleep(delay)
+            self.checked.append(perm)
+            return granted
+        return NonCallableMock(spec=[], ahas_perm=ahas_perm)
+
+    async def test_permitted(self):
+        user = self._user({'auth.view_group': (True, 0), 'auth.change_group': (True, 0)})
+        response = await self.view(self._request(user), pk=self.group.pk)
+        assert response.content == b'Permitted!'
+        assert sorted(self.checked) == ['auth.change_group', 'auth.view_group']
+
+    async def test_denied_short_circuits(self):
+        """
+        The first denial decides, and cancels the remaining checks.
+        """
+        user = self._user({'auth.view_group': (True, 1), 'auth.change_group': (False, 0)})
+        with self.assertRaises(PermissionDenied):
+            await self.view(self._request(user), pk=self.group.pk)
+        assert self.checked == ['auth.change_group']
+
+    async def test_sync_user(self):
+        """
+        Users without ``ahas_perm()`` are checked with ``has_perm()``.
+        """
+        user = NonCallableMock(spec=[], has_perm=lambda perm, obj=None: obj == self.group)
+        response = await self.view(self._request(user), pk=self.group.pk)
+        assert response.content == b'Permitted!'
+
+    async def test_not_found(self):
+        user = self._user({})
+        with self.assertRaises(Http404):
+            await self.view(self._request(user), pk=self.group.pk + 1)
@@ -2,6 +2,7 @@ from unittest import TestCase
 from mock_compat import NonCallableMock
 
 from auth_utils.backends import BaseAuthorizationBackend
+from auth_utils.perms import PermissionSet
 
 
 class TestDefaultBaseAuthorizationBackend(TestCase):
@@ -139,3 +140,307 @@ class TestCustomAuthorizationBackend(TestCase):
         assert self.backend.has_module_perms(self.active_user, 'decoy') is False
         assert self.backend.has_module_perms(self.inactive_user, 'custom') is False
         assert self.backend.has_module_perms(self.active_user, 'custom') is True
+
+
+class CompactAuthorizationBackend(CustomAuthorizationBackend):
+    compact_permissions = True
+
+
+class TestCompactAuthorizationBackend(TestCustomAuthorizationBackend):
+    """
+    `TestCustomAuthorizationBackend`, with `compact_permissions` enabled.
+    """
+
+    def setUp(self):
+        super(TestCompactAuthorizationBackend, self).setUp()
+        self.backend = CompactAuthorizationBackend()
+
+    def test_compact(self):
+        assert isinstance(self.backend.get_all_permissions(self.active_user), PermissionSet)
+        all_perms = self.backend.get_all_permissions_bulk(self.active_user, [None])
+        assert isinstance(all_perms[None], PermissionSet)
+
+
+class CountingAuthorizationBackend(CustomAuthorizationBackend):
+    """
+    See `TestCachedAuthorizationBackend`.
+    """
+    cache_permissions = True
+
+    def __init__(self):
+        self.calls = []
+
+    def get_user_permissions(self, user_obj, obj=None):
+        self.calls.append(('user', obj))
+        return super(CountingAuthorizationBackend, self).get_user_permissions(user_obj, obj)
+
+    def get_group_permissions(self, user_obj, obj=None):
+        self.calls.append(('group', obj))
+        return super(CountingAuthorizationBackend, self).get_group_permissions(user_obj, obj)
+
+
+class TestCachedAuthorizationBackend(TestCase):
+    """
+    The behavior of a `BaseAuthorizationBackend` subclass with `cache_permissions` enabled.
+    """
+
+    def setUp(self):
+        self.backend = CountingAuthorizationBackend()
+        self.user = NonCallableMock(spec=[], is_active=True)
+
+    def test_hooks_run_once_per_key(self):
+        """
+        The permission hooks run once per object, however often permissions are checked.
+        """
+        obj = object()
+        for _ in range(3):
+            assert self.backend.has_perm(self.user, 'custom.user_active_none') is True
+            assert self.backend.has_perm(self.user, 'custom.group_active_obj', obj) is True
+            assert self.backend.has_module_perms(self.user, 'custom') is True
+        assert self.backend.calls == [
+            ('user', None), ('group', None),
+            ('user', obj), ('group', obj),
+        ]
+
+    def test_model_instances_keyed_by_pk(self):
+        """
+        Instances with the same type and primary key share a cache entry.
+        """
+        class Model(object):
+            def __init__(self, pk):
+                self.pk = pk
+        self.backend.get_all_permissions(self.user, Model(1))
+        self.backend.get_all_permissions(self.user, Model(1))
+        self.backend.get_all_permissions(self.user, Model(2))
+        assert len(self.backend.calls) == 4
+
+    def test_other_objects_keyed_by_identity(self):
+        """
+        Objects without a primary key have their own cache entries, even if they are equal.
+        """
+        class Value(object):
+            def __eq__(self, other):
+                return isinstance(other, Value)
+
+            def __hash__(self):
+                return 0
+        (first, second) = (Value(), Value())
+        self.backend.get_all_permissions(self.user, first)
+        self.backend.get_all_permissions(self.user, second)
+        self.backend.get_all_permissions(self.user, first)
+        assert self.backend.calls == [
+            ('user', first), ('group', first), ('user', second), ('group', second)]
+
+    def test_cache_is_per_user(self):
+        """
+        Each user object has its own cache.
+        """
+        other_user = NonCallableMock(spec=[], is_active=True)
+        self.backend.get_all_permissions(self.user)
+        self.backend.get_all_permissions(other_user)
+        assert len(self.backend.calls) == 4
+
+    def test_clear_permission_cache(self):
+        """
+        `clear_permission_cache()` clears the given objects, or everything.
+        """
+        obj = object()
+        self.backend.get_all_permissions(self.user)
+        self.backend.get_all_permissions(self.user, obj)
+
+        self.backend.clear_permission_cache(self.user, obj)
+        self.backend.get_all_permissions(self.user)
+        self.backend.get_all_permissions(self.user, obj)
+        assert self.backend.calls[4:] == [('user', obj), ('group', obj)]
+
+        self.backend.clear_permission_cache(self.user)
+        self.backend.get_all_permissions(self.user)
+        self.backend.get_all_permissions(self.user, obj)
+        assert len(self.backend.calls) == 10
+
+    def test_unhashable_objects_not_cached(self):
+        """
+        Unhashable objects bypass the cache.
+        """
+        obj = []
+        self.backend.get_all_permissions(self.user, obj)
+        self.backend.get_all_permissions(self.user, obj)
+        assert len(self.backend.calls) == 4
+
+
+class LazyAuthorizationBackend(CountingAuthorizationBackend):
+    """
+    See `TestLazyPermissionChecks`: an uncached backend, streaming its permissions.
+    """
+    cache_permissions = False
+
+    def get_user_permissions(self, user_obj, obj=None):
+        return iter(super(LazyAuthorizationBackend, self).get_user_permissions(user_obj, obj))
+
+    def get_group_permissions(self, user_obj, obj=None):
+        return iter(super(LazyAuthorizationBackend, self).get_group_permissions(user_obj, obj))
+
+
+class TestLazyPermissionChecks(TestCase):
+    """
+    `has_perm()` only looks up group permissions if the user permissions don't grant it.
+    """
+
+    def setUp(self):
+        self.backend = LazyAuthorizationBackend()
+        self.user = NonCallableMock(spec=[], is_active=True)
+
+    def test_user_permission(self):
+        assert self.backend.has_perm(self.user, 'custom.user_active_none') is True
+        assert self.backend.calls == [('user', None)]
+
+    def test_group_permission(self):
+        assert self.backend.has_perm(self.user, 'custom.group_active_none') is True
+        assert self.backend.has_perm(self.user, 'custom.decoy') is False
+        assert self.backend.calls == [('user', None), ('group', None)] * 2
+
+    def test_get_all_permissions(self):
+        """
+        Streamed permissions are combined into a set.
+        """
+        assert self.backend.get_all_permissions(self.user) == {
+            'custom.user_active_none',
+            'custom.group_active_none',
+        }
+
+    def test_disabled(self):
+        self.backend.lazy_permission_checks = False
+        assert self.backend.has_perm(self.user, 'custom.user_active_none') is True
+        assert self.backend.calls == [('user', None), ('group', None)]
+
+    def test_customized(self):
+        """
+        Backends customizing `compute_all_permissions()` are not checked lazily.
+        """
+        class Backend(LazyAuthorizationBackend):
+            def compute_all_permissions(self, user_obj, obj=None):
+                return {'custom.computed'}
+
+        assert Backend().has_perm(self.user, 'custom.computed') is True
+        assert Backend().has_perm(self.user, 'custom.user_active_none') is False
+
+
+class BulkAuthorizationBackend(CountingAuthorizationBackend):
+    """
+    See `TestBulkAuthorizationBackend`.
+    """
+
+    def get_user_permissions_bulk(self, user_obj, objs):
+        self.calls.append(('user_bulk', list(objs)))
+        return {obj: {'custom.user_bulk'} for obj in objs}
+
+
+class TestBulkAuthorizationBackend(TestCase):
+    """
+    The bulk permission API of `BaseAuthorizationBackend`.
+    """
+
+    def setUp(self):
+        self.user = NonCallableMock(spec=[], is_active=True)
+        self.inactive_user = NonCallableMock(spec=[], is_active=False)
+        self.objs = [object(), object(), object()]
+
+    def test_default_falls_back_to_per_object(self):
+        """
+        By default, the bulk methods agree with the per-object methods.
+        """
+        backend = CustomAuthorizationBackend()
+        assert backend.get_all_permissions_bulk(self.user, self.objs) == {
+            obj: backend.get_all_permissions(self.user, obj) for obj in self.objs
+        }
+        assert backend.get_all_permissions_bulk(self.inactive_user, self.objs) == {
+            obj: set() for obj in self.objs
+        }
+        assert backend.has_perm_bulk(self.user, 'custom.user_active_obj', self.objs) == {
+            obj: True for obj in self.objs
+        }
+        assert backend.has_perm_bulk(self.user, 'custom.user_active_none', self.objs) == {
+            obj: False for obj in self.objs
+        }
+
+    def test_overridden_permission_sets(self):
+        """
+        A permission removed by an overridden `get_all_permissions()` or
+        `compute_all_permissions()` is also denied by the bulk methods.
+        """
+        archived = self.objs[0]
+
+        class ArchivedGetAll(CustomAuthorizationBackend):
+            def get_all_permissions(self, user_obj, obj=None):
+                perms = super(ArchivedGetAll, self).get_all_permissions(user_obj, obj)
+                return perms - {'custom.user_active_obj'} if obj is archived else perms
+
+        class ArchivedCompute(CountingAuthorizationBackend):
+            def compute_all_permissions(self, user_obj, obj=None):
+                perms = super(ArchivedCompute, self).compute_all_permissions(user_obj, obj)
+                return perms - {'custom.user_active_obj'} if obj is archived else perms
+
+        for backend in [ArchivedGetAll(), ArchivedCompute()]:
+            assert backend.has_perm(self.user, 'custom.user_active_obj', archived) is False
+            assert backend.has_perm_bulk(self.user, 'custom.user_active_obj', self.objs) == {
+                obj: obj is not archived for obj in self.objs
+            }
+
+    def test_bulk_hook(self):
+        """
+        A bulk hook answers for all objects at once, and seeds the permission cache.
+        """
+        backend = BulkAuthorizationBackend()
+        assert backend.has_perm_bulk(self.user, 'custom.user_bulk', self.objs) == {
+            obj: True for obj in self.objs
+        }
+        assert backend.calls[0] == ('user_bulk', self.objs)
+        assert len(backend.calls) == 1 + len(self.objs)  # Per-object group fallback
+
+        for obj in self.objs:
+            assert backend.has_perm(self.user, 'custom.user_bulk', obj) is True
+            assert backend.has_perm(self.user, 'custom.group_active_obj', obj) is True
+        assert len(backend.calls) == 1 + len(self.objs)
+
+    def test_bulk_skips_cached(self):
+        """
+        Only uncached objects are looked up.
+        """
+        backend = BulkAuthorizationBackend()
+        backend.get_all_permissions(self.user, self.objs[0])
+        del backend.calls[:]
+        backend.get_all_permissions_bulk(self.user, self.objs)
+        assert backend.calls[0] == ('user_bulk', self.objs[1:])
+
+
+class TestModuleIndex(TestCase):
+    """
+    `has_module_perms()` with `cache_permissions` enabled.
+    """
+
+    def setUp(self):
+        self.backend = CountingAuthorizationBackend()
+        self.user = NonCallableMock(spec=[], is_active=True)
+
+    def test_index(self):
+        """
+        The module index agrees with the permissions, and is built once.
+        """
+        assert self.backend.has_module_perms(self.user, 'custom') is True
+        assert self.backend.has_module_perms(self.user, 'decoy') is False
+        assert self.backend.has_module_perms(self.user, 'custom.user_active_none') is False
+        assert len(self.backend.calls) == 2
+
+    def test_index_invalidated(self):
+        """
+        Clearing the global permissions also clears the module index.
+        """
+        self.backend.has_module_perms(self.user, 'custom')
+        self.backend.clear_permission_cache(self.user, object())
+        self.backend.has_module_perms(self.user, 'custom')
+        assert len(self.backend.calls) == 2
+
+        self.backend.clear_permission_cache(self.user, None)
+        self.backend.get_all_permissions(self.user)
+        self.backend.has_module_perms(self.user, 'custom')
+        assert len(self.backend.calls) == 4
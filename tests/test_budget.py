@@ -0,0 +1,123 @@
+import threading
+import warnings
+from unittest import TestCase
+
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from mock_compat import NonCallableMock
+
+from auth_utils import instrumentation
+from auth_utils.budget import PermissionBudget, PermissionBudgetExceeded, PermissionBudgetWarning
+from auth_utils.middleware import PermissionBudgetMiddleware
+from test_backend import CountingAuthorizationBackend, CustomAuthorizationBackend
+
+
+class TestPermissionBudget(TestCase):
+    """
+    Counting and limiting permission checks.
+    """
+
+    def setUp(self):
+        self.user = NonCallableMock(spec=[], is_active=True)
+        self.backend = CustomAuthorizationBackend()
+
+    def test_counts(self):
+        with PermissionBudget() as budget:
+            self.backend.has_perm(self.user, 'custom.user_active_none')
+            self.backend.has_perm(self.user, 'custom.user_active_none')
+            self.backend.has_module_perms(self.user, 'custom')
+        assert instrumentation.sinks == []
+        assert budget.checks == 3
+        assert [event.perm for event in budget.repeats] == ['custom.user_active_none']
+
+    def test_counts_outermost_calls(self):
+        """
+        Permission set lookups are counted, but not again as part of `has_perm()`.
+        """
+        backend = CountingAuthorizationBackend()
+        objs = [object(), object()]
+        with PermissionBudget() as budget:
+            backend.get_all_permissions(self.user)
+            backend.has_perm(self.user, 'custom.user_active_none', objs[0])
+            backend.get_all_permissions_bulk(self.user, objs)
+            backend.get_all_permissions_bulk(self.user, objs)
+        assert budget.checks == 4
+        assert budget.repeats == []
+
+    def test_max_checks(self):
+        with PermissionBudget(max_checks=2):
+            self.backend.has_perm(self.user, 'custom.one')
+            self.backend.has_perm(self.user, 'custom.two')
+            with self.assertRaises(PermissionBudgetExceeded):
+                self.backend.has_perm(self.user, 'custom.three')
+        assert instrumentation.sinks == []
+
+    def test_repeats(self):
+        obj = NonCallableMock(spec=[], pk=1)
+        other = NonCallableMock(spec=[], pk=2)
+        with PermissionBudget(allow_repeats=False):
+            self.backend.has_perm(self.user, 'custom.one', obj)
+            self.backend.has_perm(self.user, 'custom.one', other)
+            self.backend.has_perm(self.user, 'custom.two', obj)
+            with self.assertRaises(PermissionBudgetExceeded):
+                self.backend.has_perm(self.user, 'custom.one', obj)
+
+    def test_warn(self):
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            with PermissionBudget(max_checks=0, action='warn'):
+                self.backend.has_perm(self.user, 'custom.one')
+                self.backend.has_perm(self.user, 'custom.two')
+        assert [w.category for w in caught] == [PermissionBudgetWarning]
+
+    def test_log(self):
+        with self.assertLogs('auth_utils.budget', 'WARNING') as logs:
+            with PermissionBudget(max_checks=0, action='log'):
+                self.backend.has_perm(self.user, 'custom.one')
+        assert len(logs.output) == 1
+
+    def test_unknown_action(self):
+        with self.assertRaises(ValueError):
+            PermissionBudget(action='ignore')
+
+    def test_other_threads(self):
+        """
+        Checks made in other threads are not counted.
+        """
+        with PermissionBudget() as budget:
+            thread = threading.Thread(
+                target=self.backend.has_perm, args=(self.user, 'custom.one'))
+            thread.start()
+            thread.join()
+        assert budget.checks == 0
+
+
+class TestPermissionBudgetMiddleware(SimpleTestCase):
+    """
+    Per-request permission budgets.
+    """
+
+    def setUp(self):
+        self.user = NonCallableMock(spec=[], is_active=True)
+        self.backend = CustomAuthorizationBackend()
+
+    def view(self, request):
+        for perm in ['custom.one', 'custom.two', 'custom.one']:
+            self.backend.has_perm(self.user, perm)
+        return HttpResponse()
+
+    def test_default(self):
+        request = RequestFactory().get('/')
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            PermissionBudgetMiddleware(self.view)(request)
+        assert instrumentation.sinks == []
+        assert request.permission_budget.checks == 3
+        assert [w.category for w in caught] == [PermissionBudgetWarning]
+
+    @override_settings(AUTH_UTILS_PERMISSION_BUDGET={'max_checks': 2, 'action': 'raise'})
+    def test_settings(self):
+        with self.assertRaises(PermissionBudgetExceeded):
+            PermissionBudgetMiddleware(self.view)(RequestFactory().get('/'))
+        assert instrumentation.sinks == []
@@ -0,0 +1,293 @@
+import threading
+import time
+from unittest import TestCase
+
+from django.contrib.auth.models import Group
+from django.core.cache import caches
+from django.test import SimpleTestCase, override_settings
+
+from mock_compat import NonCallableMock, patch
+
+from auth_utils.backends import BaseAuthorizationBackend
+from auth_utils.cache import (
+    CacheStats, LocalPermissionCacheMixin, PermissionCache, SharedPermissionCacheMixin,
+)
+
+
+class SharedBackend(SharedPermissionCacheMixin, BaseAuthorizationBackend):
+    """
+    Grant 'custom.perm', counting lookups.
+    """
+    permission_cache_alias = 'shared'
+    calls = []
+
+    def get_user_permissions(self, user_obj, obj=None):
+        self.calls.append(obj)
+        return {'custom.perm'}
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'shared': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'shared'},
+})
+class TestSharedPermissionCacheMixin(SimpleTestCase):
+    """
+    `SharedPermissionCacheMixin`
+    """
+
+    def setUp(self):
+        caches['shared'].clear()
+        del SharedBackend.calls[:]
+        self.group = Group(pk=1, name='group')
+
+    def _user(self, pk=1):
+        # A fresh user object, as in a different request or process.
+        return NonCallableMock(spec=[], pk=pk, is_active=True)
+
+    def _check(self, user, obj=None):
+        assert SharedBackend().has_perm(user, 'custom.perm', obj) is True
+
+    def test_shared(self):
+        """
+        Permissions are computed once per user and object, across user and backend instances.
+        """
+        for _ in range(2):
+            self._check(self._user())
+            self._check(self._user(), self.group)
+        self._check(self._user(2))
+        assert SharedBackend.calls == [None, self.group, None]
+
+    def test_bulk(self):
+        """
+        The bulk methods share the cache.
+        """
+        other_group = Group(pk=2, name='other')
+        SharedBackend().get_all_permissions_bulk(self._user(), [self.group])
+        SharedBackend().get_all_permissions_bulk(self._user(), [self.group, other_group])
+        self._check(self._user(), other_group)
+        assert SharedBackend.calls == [self.group, other_group]
+
+    def test_uncacheable(self):
+        """
+        Anonymous users and objects without a database identity are not cached.
+        """
+        obj = object()
+        for _ in range(2):
+            self._check(self._user(None))
+            self._check(self._user(), obj)
+        assert SharedBackend.calls == [None, obj, None, obj]
+
+    def test_clear_user(self):
+        """
+        Clearing a user's permissions recomputes them for that user only.
+        """
+        self._check(self._user(1))
+        self._check(self._user(2))
+        SharedBackend.clear_shared_permission_cache(self._user(1))
+        self._check(self._user(1))
+        self._check(self._user(2))
+        assert SharedBackend.calls == [None, None, None]
+
+    def test_clear_all(self):
+        """
+        Clearing without a user recomputes everyone's permissions.
+        """
+        self._check(self._user(1))
+        self._check(self._user(2))
+        SharedBackend.clear_shared_permission_cache()
+        self._check(self._user(1))
+        self._check(self._user(2))
+        assert len(SharedBackend.calls) == 4
+
+    def test_evicted_version(self):
+        """
+        If a version number is evicted, older entries are not resurrected.
+        """
+        self._check(self._user())
+        caches['shared'].delete(SharedBackend._get_version_key(1))
+        self._check(self._user())
+        assert len(SharedBackend.calls) == 2
+
+
+class TestPermissionCache(TestCase):
+    """
+    `PermissionCache`
+    """
+
+    def test_lru(self):
+        cache = PermissionCache(max_size=2, stripes=1)
+        cache.get_or_compute('a', lambda: 1)
+        cache.get_or_compute('b', lambda: 2)
+        assert cache.get_or_compute('a', lambda: 'recomputed') == 1
+        cache.get_or_compute('c', lambda: 3)  # Evicts 'b'
+        assert cache.get_or_compute('a', lambda: 'recomputed') == 1
+        assert cache.get_or_compute('b', lambda: 'recomputed') == 'recomputed'
+        assert cache.stats == CacheStats(hits=2, misses=4, evictions=2, size=2)
+
+    def test_timeout(self):
+        cache = PermissionCache(timeout=10)
+        with patch('auth_utils.cache._clock', return_value=100):
+            cache.get_or_compute('a', lambda: 1)
+            cache.get_or_compute('b', lambda: 2, timeout=20)
+        with patch('auth_utils.cache._clock', return_value=115):
+            assert cache.get_or_compute('a', lambda: 'recomputed') == 'recomputed'
+            assert cache.get_or_compute('b', lambda: 'recomputed') == 2
+
+    def test_invalidate(self):
+        cache = PermissionCache()
+        for key in ['a1', 'a2', 'b1']:
+            cache.get_or_compute(key, lambda: 'old')
+        cache.invalidate(lambda key: key.startswith('a'))
+        assert cache.stats.size == 1
+        assert cache.get_or_compute('a1', lambda: 'new') == 'new'
+        assert cache.get_or_compute('b1', lambda: 'new') == 'old'
+        cache.clear()
+        assert cache.stats == CacheStats(0, 0, 0, 0)
+
+    def test_get_many(self):
+        cache = PermissionCache()
+        cache.get_or_compute('a', lambda: 1)
+        computed = []
+
+        def compute_many(keys):
+            computed.append(keys)
+            if 'c' in keys:
+                cache.invalidate(lambda key: key == 'c')  # Not cached, but returned.
+            return {key: key * 2 for key in keys}
+        assert cache.get_many_or_compute(['a', 'b', 'c'], compute_many) == {
+            'a': 1, 'b': 'bb', 'c': 'cc'}
+        assert cache.get_many_or_compute(['a', 'b', 'c'], compute_many) == {
+            'a': 1, 'b': 'bb', 'c': 'cc'}
+        assert computed == [['b', 'c'], ['c']]
+
+    def test_single_flight(self):
+        """
+        Concurrent misses for a key wait for a single computation.
+        """
+        cache = PermissionCache()
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def compute():
+            calls.append(None)
+            started.set()
+            release.wait()
+            return 'value'
+
+        results = []
+
+        def get():
+            results.append(cache.get_or_compute('key', compute))
+
+        threads = [threading.Thread(target=get) for _ in range(5)]
+        threads[0].start()
+        started.wait()
+        for thread in threads[1:]:
+            thread.start()
+        while cache.stats.misses < 5:
+            time.sleep(0.001)
+        release.set()
+        for thread in threads:
+            thread.join()
+        assert results == ['value'] * 5
+        assert len(calls) == 1
+
+    def test_error(self):
+        """
+        Errors are not cached.
+        """
+        cache = PermissionCache()
+
+        def fail():
+            raise KeyError('fail')
+
+        with self.assertRaises(KeyError):
+            cache.get_or_compute('key', fail)
+        assert cache.get_or_compute('key', lambda: 'value') == 'value'
+
+    def test_invalidated_while_computing(self):
+        cache = PermissionCache()
+
+        def compute():
+            cache.invalidate()
+            return 'stale'
+
+        assert cache.get_or_compute('key', compute) == 'stale'
+        assert cache.get_or_compute('key', lambda: 'fresh') == 'fresh'
+
+
+class LocalBackend(LocalPermissionCacheMixin, BaseAuthorizationBackend):
+    """
+    Grant 'custom.perm', counting lookups.
+    """
+    calls = []
+
+    def get_user_permissions(self, user_obj, obj=None):
+        self.calls.append(obj)
+        return {'custom.perm'}
+
+    def get_user_permissions_bulk(self, user_obj, objs):
+        self.calls.append(list(objs))
+        return {obj: {'custom.perm'} for obj in objs}
+
+
+class TestLocalPermissionCacheMixin(TestCase):
+    """
+    `LocalPermissionCacheMixin`
+    """
+
+    def setUp(self):
+        LocalBackend.get_local_permission_cache().clear()
+        del LocalBackend.calls[:]
+        self.group = Group(pk=1, name='group')
+
+    def _check(self, user, obj=None):
+        assert LocalBackend().has_perm(user, 'custom.perm', obj) is True
+
+    def _user(self, pk=1):
+        return NonCallableMock(spec=[], pk=pk, is_active=True)
+
+    def test_cached(self):
+        """
+        Permissions are computed once per user and object, across user and backend instances.
+        """
+        for _ in range(2):
+            self._check(self._user())
+            self._check(self._user(), self.group)
+            self._check(self._user(None))
+        assert LocalBackend.calls == [None, self.group, None, None]
+        assert LocalBackend.get_local_permission_cache().stats.hits == 2
+
+    def test_bulk(self):
+        """
+        Bulk lookups read and fill the cache, computing the missing objects at once.
+        """
+        groups = [Group(pk=pk, name='group') for pk in range(1, 4)]
+        unsaved = object()
+        self._check(self._user(), groups[0])
+        assert LocalBackend().has_perm_bulk(self._user(), 'custom.perm', groups + [unsaved]) == {
+            obj: True for obj in groups + [unsaved]
+        }
+        assert LocalBackend.calls == [groups[0], groups[1:], [unsaved]]
+        for group in groups:
+            self._check(self._user(), group)
+        assert len(LocalBackend.calls) == 3
+        assert LocalBackend.get_local_permission_cache().stats.size == 3
+
+    def test_per_class(self):
+        class OtherBackend(LocalBackend):
+            pass
+        assert (OtherBackend.get_local_permission_cache() is not
+                LocalBackend.get_local_permission_cache())
+
+    def test_invalidate(self):
+        self._check(self._user(1))
+        self._check(self._user(1), self.group)
+        self._check(self._user(2), self.group)
+        LocalBackend.invalidate_cached_permissions(self._user(1), self.group)
+        assert LocalBackend.get_local_permission_cache().stats.size == 2
+        LocalBackend.invalidate_cached_permissions(self._user(1))
+        assert LocalBackend.get_local_permission_cache().stats.size == 1
+        LocalBackend.invalidate_cached_permissions(obj=self.group)
+        assert LocalBackend.get_local_permission_cache().stats.size == 0
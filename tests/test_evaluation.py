@@ -0,0 +1,189 @@
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.exceptions import PermissionDenied
+from django.test import SimpleTestCase, override_settings
+
+from mock_compat import NonCallableMock
+
+from auth_utils import evaluation
+from auth_utils.backends import BaseAuthorizationBackend
+from auth_utils.evaluation import (
+    PermissionEvaluator, has_default_perm_checks, has_no_perms, has_perms,
+)
+
+calls = []
+
+
+class SetBackend(BaseAuthorizationBackend):
+    """
+    Grant 'custom.a' and 'custom.b', from a permission set.
+    """
+
+    def get_user_permissions(self, user_obj, obj=None):
+        calls.append('set')
+        return {'custom.a', 'custom.b'}
+
+
+class PlainBackend(object):
+    """
+    Grant 'custom.c', one permission at a time.
+    """
+
+    def has_perm(self, user_obj, perm, obj=None):
+        calls.append(('plain', perm))
+        return perm == 'custom.c'
+
+
+class OverridingBackend(SetBackend):
+    """
+    Grant only 'custom.c', overriding `has_perm()` (and so its permission set).
+    """
+
+    def has_perm(self, user_obj, perm, obj=None):
+        calls.append(('override', perm))
+        return perm == 'custom.c'
+
+
+class VetoBackend(object):
+    """
+    Deny 'custom.vetoed' outright.
+    """
+
+    def has_perm(self, user_obj, perm, obj=None):
+        calls.append(('veto', perm))
+        if perm == 'custom.vetoed':
+            raise PermissionDenied
+        return False
+
+
+@override_settings(AUTHENTICATION_BACKENDS=[
+    'test_evaluation.SetBackend',
+    'test_evaluation.PlainBackend',
+    'test_evaluation.VetoBackend',
+])
+class TestPermissionEvaluator(SimpleTestCase):
+    """
+    `PermissionEvaluator` and `has_perms()`
+    """
+
+    def setUp(self):
+        self.user = NonCallableMock(spec=[], is_active=True, is_superuser=False)
+        del calls[:]
+        evaluation._backend_costs.clear()
+
+    def test_permission_set_computed_once(self):
+        """
+        Each permission-set backend computes its permissions once.
+        """
+        assert has_perms(self.user, ['custom.a', 'custom.b', 'custom.c']) is True
+        assert calls == ['set', ('plain', 'custom.c')]
+
+    def test_stops_at_first_failure(self):
+        assert has_perms(self.user, ['custom.x', 'custom.a', 'custom.c']) is False
+        assert calls == ['set', ('plain', 'custom.x'), ('veto', 'custom.x')]
+
+    def test_require_any(self):
+        assert has_perms(self.user, ['custom.x', 'custom.c'], require_all=False) is True
+        assert has_perms(self.user, ['custom.x', 'custom.y'], require_all=False) is False
+
+    def test_permission_denied(self):
+        assert has_perms(self.user, ['custom.vetoed']) is False
+        assert has_perms(self.user, ['custom.vetoed', 'custom.a'], require_all=False) is True
+
+    def test_superuser_and_inactive(self):
+        superuser = NonCallableMock(spec=[], is_active=True, is_superuser=True)
+        inactive = NonCallableMock(spec=[], is_active=False, is_superuser=True)
+        assert has_perms(superuser, ['custom.x']) is True
+        assert calls == []
+        assert has_perms(inactive, ['custom.a']) is False
+
+    def test_order_by_cost(self):
+        """
+        Backends are asked in order of observed cost.
+        """
+        evaluation._backend_costs.update({
+            SetBackend: [3.0, 1],
+            PlainBackend: [2.0, 1],
+            VetoBackend: [1.0, 1],
+        })
+        evaluator = PermissionEvaluator(self.user, order_by_cost=True)
+        assert evaluator.has_perm('custom.a') is True
+        assert calls == [('veto', 'custom.a'), ('plain', 'custom.a'), 'set']
+        assert evaluation._backend_costs[VetoBackend][1] == 2
+
+    @override_settings(AUTHENTICATION_BACKENDS=['test_evaluation.OverridingBackend'])
+    def test_has_perm_override(self):
+        """
+        Backends overriding `has_perm()` are asked one permission at a time.
+        """
+        assert has_perms(self.user, ['custom.a', 'custom.c'], require_all=False) is True
+        assert calls == [('override', 'custom.a'), ('override', 'custom.c')]
+
+
+class TestHasNoPerms(SimpleTestCase):
+    """
+    `has_no_perms()`
+    """
+
+    def setUp(self):
+        self.inactive = User(is_active=False)
+        self.active = User(is_active=True)
+        del calls[:]
+
+    @override_settings(AUTHENTICATION_BACKENDS=[
+        'django.contrib.auth.backends.ModelBackend',
+        'test_evaluation.SetBackend',
+    ])
+    def test_denying_backends(self):
+        assert has_no_perms(self.inactive) is True
+        assert has_no_perms(self.active) is False
+        assert has_perms(self.inactive, ['custom.a']) is False
+        assert calls == []
+
+    @override_settings(AUTHENTICATION_BACKENDS=[
+        'test_evaluation.SetBackend',
+        'test_evaluation.PlainBackend',
+    ])
+    def test_other_backends(self):
+        """
+        Backends that aren't known to deny inactive users are asked.
+        """
+        assert has_no_perms(self.inactive) is False
+        assert has_perms(self.inactive, ['custom.c']) is True
+        assert calls == [('plain', 'custom.c')]
+
+    @override_settings(AUTHENTICATION_BACKENDS=['test_evaluation.GuestBackend'])
+    def test_opted_out(self):
+        assert has_no_perms(self.inactive) is False
+
+    @override_settings(AUTHENTICATION_BACKENDS=['django.contrib.auth.backends.ModelBackend'])
+    def test_custom_user(self):
+        """
+        Users with their own permission checks may not ask the backends, so they are asked.
+        """
+        class SuspendedUser(AnonymousUser):
+            def has_perm(self, perm, obj=None):
+                return perm == 'custom.c'
+
+        assert has_no_perms(SuspendedUser()) is False
+
+
+class GuestBackend(SetBackend):
+    denies_inactive_users = False
+
+
+class TestHasDefaultPermChecks(SimpleTestCase):
+    """
+    `has_default_perm_checks()`
+    """
+
+    def test_django_users(self):
+        assert has_default_perm_checks(User()) is True
+        assert has_default_perm_checks(AnonymousUser()) is True
+
+    def test_custom_users(self):
+        class SuspendedUser(AnonymousUser):
+            def has_perm(self, perm, obj=None):
+                return False
+
+        assert has_default_perm_checks(SuspendedUser()) is False
+        assert has_default_perm_checks(NonCallableMock(spec=[])) is False
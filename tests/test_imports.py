@@ -0,0 +1,45 @@
+import os
+import subprocess
+import sys
+from unittest import TestCase, skipIf
+
+import django
+
+
+def get_imported_modules(code):
+    """
+    Run ``code`` in a fresh interpreter, and return the modules it imports, with ``-X importtime``.
+    """
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    output = subprocess.check_output(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        stderr=subprocess.STDOUT, env=env, universal_newlines=True,
+    )
+    return {line.rsplit('|', 1)[1].strip() for line in output.splitlines()
+            if line.startswith('import time:') and '|' in line}
+
+
+@skipIf(sys.version_info < (3, 7), '-X importtime requires Python 3.7+')
+class TestImportTime(TestCase):
+    """
+    Importing auth_utils stays cheap: heavy dependencies are loaded on first use.
+    """
+
+    def test_backends(self):
+        """
+        Backends can be imported without Django's auth, dispatch or async machinery.
+        """
+        imported = get_imported_modules('import auth_utils.backends')
+        assert 'auth_utils.backends' in imported
+        for module in ['asyncio', 'attr', 'django.contrib.auth', 'django.db', 'django.dispatch']:
+            assert module not in imported
+
+    @skipIf(django.VERSION < (1, 9), 'the compatibility copy is needed on Django 1.8')
+    def test_views_and_templatetags(self):
+        imported = get_imported_modules(
+            'import django; django.setup(); '
+            'import auth_utils.views, auth_utils.templatetags.auth_utils'
+        )
+        assert 'auth_utils.views' in imported
+        assert 'auth_utils.django18_compat' not in imported
+        assert 'attr' not in imported
@@ -0,0 +1,104 @@
+from unittest import TestCase
+
+from django.template import Context, Template
+from django.test import RequestFactory, SimpleTestCase
+
+from mock_compat import Mock, NonCallableMock
+
+from auth_utils import instrumentation
+from auth_utils.instrumentation import (
+    LoggingSink, StatsSink, permission_checked, record, recording, signal_sink,
+)
+from test_backend import CountingAuthorizationBackend, CustomAuthorizationBackend
+from test_views import PermissionView
+
+
+class TestInstrumentation(TestCase):
+    """
+    Instrumentation of permission checks.
+    """
+
+    def setUp(self):
+        self.user = NonCallableMock(spec=[], is_active=True)
+        self.backend_name = 'test_backend.CountingAuthorizationBackend'
+
+    def test_off_by_default(self):
+        assert instrumentation.sinks == []
+
+    def test_backend(self):
+        """
+        Backend calls and cache lookups are recorded per kind, permission and backend.
+        """
+        backend = CountingAuthorizationBackend()
+        with recording(StatsSink()) as stats:
+            backend.has_perm(self.user, 'custom.user_active_none')
+            backend.has_perm(self.user, 'custom.user_active_none')
+            backend.has_module_perms(self.user, 'custom')
+        assert instrumentation.sinks == []
+
+        assert stats.kinds['backend.has_perm'].calls == 2
+        assert stats.kinds['backend.has_module_perms'].calls == 1
+        assert stats.kinds['backend.get_all_permissions'].calls == 3
+        assert stats.kinds['backend.cache'].misses == 1
+        assert stats.kinds['backend.cache'].hits == 2
+        assert stats.perms['custom.user_active_none'].calls == 2
+        assert stats.perms['custom'].calls == 1
+        backend_stats = stats.backends[self.backend_name]
+        assert (backend_stats.calls, backend_stats.hits, backend_stats.misses) == (6, 2, 1)
+        assert backend_stats.time > 0
+
+    def test_uncached_backend(self):
+        """
+        Backends without a cache record no cache lookups.
+        """
+        with recording(StatsSink()) as stats:
+            CustomAuthorizationBackend().has_perm(self.user, 'custom.user_active_none')
+        assert 'backend.cache' not in stats.kinds
+
+    def test_templates(self):
+        _meta = NonCallableMock(spec=[], app_label='custom', model_name='foo')
+        obj = NonCallableMock(spec=[], _meta=_meta)
+        user = NonCallableMock(spec=[], has_perm=Mock(return_value=True))
+        template = Template(
+            '{% load auth_utils %}'
+            '{% if "custom.perm" in user|perms:obj %}{% endif %}'
+            '{% if user|can_change:obj %}{% endif %}'
+            '{% if user|can_change:obj %}{% endif %}'
+        )
+        with recording(StatsSink()) as stats:
+            template.render(Context({'user': user, 'obj': obj}))
+        assert stats.kinds['template.perms'].calls == 1
+        assert stats.kinds['template.can_change'].calls == 2
+        assert stats.kinds['template.cache'].misses == 2
+        assert stats.kinds['template.cache'].hits == 1
+        assert stats.perms['custom.change_foo'].calls == 2
+
+    def test_logging_sink(self):
+        logger = Mock()
+        with recording(LoggingSink(logger)):
+            record('test', perm='custom.perm')
+        assert logger.log.call_count == 1
+
+    def test_signal_sink(self):
+        events = []
+
+        def receiver(sender, event, **kwargs):
+            events.append(event)
+        permission_checked.connect(receiver)
+        try:
+            with recording(signal_sink):
+                record('test', perm='custom.perm', hit=True)
+        finally:
+            permission_checked.disconnect(receiver)
+        assert [(event.kind, event.perm, event.hit) for event in events] == [
+            ('test', 'custom.perm', True)]
+
+
+class TestViewInstrumentation(SimpleTestCase):
+
+    def test_view(self):
+        request = RequestFactory().get('/')
+        request.user = NonCallableMock(spec=[], has_perms=lambda perms, obj=None: True)
+        with recording(StatsSink()) as stats:
+            PermissionView.as_view()(request)
+        assert stats.perms['custom.always custom.object'].calls == 1
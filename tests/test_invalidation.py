@@ -0,0 +1,87 @@
+from django.contrib.auth.models import Group, Permission, User
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+
+from auth_utils.backends import BaseAuthorizationBackend
+from auth_utils.cache import SharedPermissionCacheMixin, get_user_cache
+from auth_utils.invalidation import invalidate_permissions
+
+
+class GroupPermissionsBackend(SharedPermissionCacheMixin, BaseAuthorizationBackend):
+    """
+    Grant the permissions of the user's groups and user permissions, cached in the shared cache.
+    """
+
+    def get_user_permissions(self, user_obj, obj=None):
+        return {'auth.' + codename
+                for codename in user_obj.user_permissions.values_list('codename', flat=True)}
+
+    def get_group_permissions(self, user_obj, obj=None):
+        return {'auth.' + codename
+                for codename in Permission.objects.filter(group__user=user_obj)
+                .values_list('codename', flat=True)}
+
+
+@override_settings(AUTHENTICATION_BACKENDS=['test_invalidation.GroupPermissionsBackend'])
+class TestInvalidation(TestCase):
+    """
+    Cached permissions are invalidated when users, groups and permissions change.
+    """
+
+    def setUp(self):
+        caches['default'].clear()
+        self.user = User.objects.create(username='user')
+        self.group = Group.objects.create(name='group')
+        self.perm = Permission.objects.get(codename='change_group')
+
+    def _perms(self):
+        # Fetch the user again, as in a new request.
+        return GroupPermissionsBackend().get_all_permissions(User.objects.get(pk=self.user.pk))
+
+    def test_group_membership(self):
+        self.group.permissions.add(self.perm)
+        assert self._perms() == set()
+        self.user.groups.add(self.group)
+        assert self._perms() == {'auth.change_group'}
+        self.group.user_set.remove(self.user)
+        assert self._perms() == set()
+
+    def test_group_permissions(self):
+        self.user.groups.add(self.group)
+        assert self._perms() == set()
+        self.group.permissions.add(self.perm)
+        assert self._perms() == {'auth.change_group'}
+        self.group.delete()
+        assert self._perms() == set()
+
+    def test_user_permissions(self):
+        assert self._perms() == set()
+        self.user.user_permissions.add(self.perm)
+        assert self._perms() == {'auth.change_group'}
+        self.perm.user_set.clear()
+        assert self._perms() == set()
+
+    def test_is_active(self):
+        self.user.user_permissions.add(self.perm)
+        assert self._perms() == {'auth.change_group'}
+        self.user.is_active = False
+        self.user.save()
+        assert self._perms() == set()
+        self.user.is_active = True
+        self.user.save()
+        assert self._perms() == {'auth.change_group'}
+
+    def test_invalidate_permissions(self):
+        """
+        `invalidate_permissions()` also clears the caches on the given user object.
+        """
+        get_user_cache(self.user, 'test')['key'] = 'value'
+        invalidate_permissions(self.user)
+        assert get_user_cache(self.user, 'test') == {}
+
+        assert self._perms() == set()
+        # Creating the relation directly sends no m2m_changed signal.
+        User.user_permissions.through.objects.create(user=self.user, permission=self.perm)
+        assert self._perms() == set()
+        invalidate_permissions()
+        assert self._perms() == {'auth.change_group'}
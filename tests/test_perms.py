@@ -0,0 +1,79 @@
+import pickle
+from unittest import TestCase
+
+from django.contrib.auth.models import Group, Permission
+
+from auth_utils.perms import PermissionSet, get_model_perms, get_perm_string, intern_perm
+
+
+class TestPermStrings(TestCase):
+    """
+    The permission string helpers.
+    """
+
+    def test_get_model_perms(self):
+        """
+        `get_model_perms()` returns the default permissions, for models, instances and options.
+        """
+        expected = {
+            'add': 'auth.add_group',
+            'change': 'auth.change_group',
+            'delete': 'auth.delete_group',
+            'view': 'auth.view_group',
+        }
+        assert get_model_perms(Group) == expected
+        assert get_model_perms(Group(name='x')) == expected
+        assert get_model_perms(Group._meta) is get_model_perms(Group)
+
+    def test_get_perm_string(self):
+        """
+        `get_perm_string()` supports default and custom actions.
+        """
+        assert get_perm_string('change', Permission) == 'auth.change_permission'
+        assert get_perm_string('publish', Permission) == 'auth.publish_permission'
+        assert get_perm_string('publish', Permission._meta) == 'auth.publish_permission'
+
+
+class TestPermissionSet(TestCase):
+    """
+    Compact permission sets.
+    """
+
+    def test_intern_perm(self):
+        assert intern_perm('compact.one') == intern_perm('compact.one')
+        assert intern_perm('compact.one') != intern_perm('compact.two')
+
+    def test_set(self):
+        perms = PermissionSet(['compact.a', 'compact.b'])
+        assert 'compact.a' in perms
+        assert 'compact.c' not in perms
+        assert 'compact.never_interned' not in perms
+        assert len(perms) == 2
+        assert set(perms) == {'compact.a', 'compact.b'}
+        assert perms == {'compact.a', 'compact.b'}
+        assert perms == PermissionSet(['compact.b', 'compact.a'])
+        assert perms != PermissionSet(['compact.a'])
+        assert not PermissionSet()
+        assert perms
+
+    def test_operators(self):
+        ab = PermissionSet(['compact.a', 'compact.b'])
+        bc = PermissionSet(['compact.b', 'compact.c'])
+        assert ab | bc == {'compact.a', 'compact.b', 'compact.c'}
+        assert ab & bc == {'compact.b'}
+        assert ab - bc == {'compact.a'}
+        assert not ab.isdisjoint(bc)
+        assert isinstance(ab | bc, PermissionSet)
+        # Mixing with plain sets
+        assert ab | {'compact.d'} == {'compact.a', 'compact.b', 'compact.d'}
+        assert {'compact.d'} | ab == {'compact.a', 'compact.b', 'compact.d'}
+        assert isinstance(set() | ab, PermissionSet)
+
+    def test_pickle(self):
+        """
+        Pickles hold the permission strings, not their process-specific numbers.
+        """
+        perms = PermissionSet(['compact.a', 'compact.b'])
+        data = pickle.dumps(perms)
+        assert b'compact.a' in data
+        assert pickle.loads(data) == perms
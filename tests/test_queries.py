@@ -0,0 +1,127 @@
+from django.contrib.auth.models import Group
+from django.core.exceptions import PermissionDenied
+from django.test import TestCase, override_settings
+
+from mock_compat import NonCallableMock
+
+from auth_utils.backends import BaseAuthorizationBackend
+from auth_utils.queries import filter_by_perm
+
+
+class EvenGroupsBackend(BaseAuthorizationBackend):
+    """
+    Grant 'custom.even' on groups with even-numbered names, using the default `filter_queryset()`.
+    """
+    filter_queryset_chunk_size = 3
+
+    def get_user_permissions(self, user_obj, obj=None):
+        if isinstance(obj, Group) and int(obj.name) % 2 == 0:
+            return {'custom.even'}
+        return set()
+
+
+class SmallGroupsBackend(BaseAuthorizationBackend):
+    """
+    Grant 'custom.even' on groups with names below 3, filtering in the database.
+    """
+
+    def filter_queryset(self, user_obj, perm, queryset):
+        if perm == 'custom.even':
+            return queryset.filter(name__in=['0', '1', '2'])
+        return queryset.none()
+
+
+class OwnerGroupsBackend(BaseAuthorizationBackend):
+    """
+    Grant 'custom.even' on the groups named after the user, by overriding `has_perm()`.
+    """
+
+    def has_perm(self, user_obj, perm, obj=None):
+        return perm == 'custom.even' and obj is not None and obj.name == user_obj.username
+
+
+class VetoBackend(object):
+    """
+    A plain backend that denies group 4 outright.
+    """
+
+    def has_perm(self, user_obj, perm, obj=None):
+        if obj.name == '4':
+            raise PermissionDenied
+        return False
+
+
+class TestFilterByPerm(TestCase):
+    """
+    `filter_by_perm()`
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        Group.objects.bulk_create([Group(name=str(i)) for i in range(10)])
+
+    def setUp(self):
+        self.user = NonCallableMock(spec=[], is_active=True, is_superuser=False)
+        self.queryset = Group.objects.all()
+
+    def _names(self, user, perm='custom.even'):
+        return sorted(filter_by_perm(user, perm, self.queryset).values_list('name', flat=True))
+
+    @override_settings(AUTHENTICATION_BACKENDS=[
+        'django.contrib.auth.backends.ModelBackend',
+        'test_queries.EvenGroupsBackend',
+    ])
+    def test_default_filter_queryset(self):
+        """
+        The default `filter_queryset()` checks each object.
+        """
+        assert self._names(self.user) == ['0', '2', '4', '6', '8']
+        assert self._names(self.user, 'custom.unknown') == []
+
+    @override_settings(AUTHENTICATION_BACKENDS=[
+        'test_queries.EvenGroupsBackend',
+        'test_queries.SmallGroupsBackend',
+    ])
+    def test_backends_combined(self):
+        """
+        The results of all backends are combined.
+        """
+        assert self._names(self.user) == ['0', '1', '2', '4', '6', '8']
+
+    @override_settings(AUTHENTICATION_BACKENDS=['test_queries.OwnerGroupsBackend'])
+    def test_overridden_has_perm(self):
+        """
+        The default `filter_queryset()` agrees with an overridden `has_perm()`.
+        """
+        owner = NonCallableMock(spec=[], is_active=True, is_superuser=False, username='3')
+        assert self._names(owner) == ['3']
+
+    @override_settings(AUTHENTICATION_BACKENDS=[
+        'test_queries.EvenGroupsBackend',
+        'test_queries.VetoBackend',
+    ])
+    def test_permission_denied(self):
+        """
+        A backend raising `PermissionDenied` doesn't veto objects granted by earlier backends.
+        """
+        assert self._names(self.user) == ['0', '2', '4', '6', '8']
+
+    @override_settings(AUTHENTICATION_BACKENDS=[
+        'test_queries.VetoBackend',
+        'test_queries.EvenGroupsBackend',
+    ])
+    def test_permission_denied_first(self):
+        """
+        A backend raising `PermissionDenied` vetoes objects not granted by earlier backends.
+        """
+        assert self._names(self.user) == ['0', '2', '6', '8']
+
+    @override_settings(AUTHENTICATION_BACKENDS=['test_queries.EvenGroupsBackend'])
+    def test_superuser_and_inactive(self):
+        """
+        Active superusers see everything, and inactive users nothing.
+        """
+        superuser = NonCallableMock(spec=[], is_active=True, is_superuser=True)
+        inactive_user = NonCallableMock(spec=[], is_active=False, is_superuser=True)
+        assert len(self._names(superuser)) == 10
+        assert self._names(inactive_user) == []
@@ -0,0 +1,113 @@
+from unittest import TestCase
+
+from mock_compat import NonCallableMock
+
+from auth_utils.roles import RoleHierarchy, RoleHierarchyBackend
+
+
+class SpyRoleHierarchy(RoleHierarchy):
+    """
+    Record each published version of the precomputed permissions.
+    """
+
+    def __init__(self):
+        self.published = []
+        super(SpyRoleHierarchy, self).__init__()
+
+    @property
+    def _closure(self):
+        return self.published[-1]
+
+    @_closure.setter
+    def _closure(self, closure):
+        self.published.append(closure)
+
+
+class TestRoleHierarchy(TestCase):
+    """
+    Precomputed role permissions.
+    """
+
+    def setUp(self):
+        self.roles = RoleHierarchy()
+        self.roles.add_role('reader', {'news.view_article'})
+        self.roles.add_role('author', {'news.add_article'}, includes={'reader'})
+        self.roles.add_role('editor', {'news.change_article'}, includes={'author'})
+        self.roles.add_role('moderator', {'news.delete_comment'}, includes={'reader'})
+
+    def test_permissions(self):
+        assert self.roles.get_permissions('reader') == {'news.view_article'}
+        assert self.roles.get_permissions('editor') == {
+            'news.view_article', 'news.add_article', 'news.change_article',
+        }
+        assert self.roles.get_permissions('missing') == set()
+        assert self.roles.get_roles_permissions(['author', 'moderator', 'missing']) == {
+            'news.view_article', 'news.add_article', 'news.delete_comment',
+        }
+
+    def test_replace_role(self):
+        """
+        Changing a role updates the roles that include it.
+        """
+        self.roles.add_role('reader', {'news.view_article', 'news.view_comment'})
+        assert 'news.view_comment' in self.roles.get_permissions('editor')
+        assert 'news.view_comment' in self.roles.get_permissions('moderator')
+
+        self.roles.add_role('author', {'news.add_article'})
+        assert self.roles.get_permissions('editor') == {'news.add_article', 'news.change_article'}
+        assert 'news.view_comment' in self.roles.get_permissions('moderator')
+
+    def test_remove_role(self):
+        self.roles.remove_role('author')
+        assert self.roles.get_permissions('author') == set()
+        assert self.roles.get_permissions('editor') == {'news.change_article'}
+        self.roles.add_role('author', {'news.add_article'})
+        assert self.roles.get_permissions('editor') == {'news.change_article'}
+
+    def test_remove_role_published_once(self):
+        """
+        Removing a role publishes the updated permissions of all roles at once.
+        """
+        roles = SpyRoleHierarchy()
+        roles.add_role('reader', {'news.view_article'})
+        roles.add_role('author', {'news.add_article'}, includes={'reader'})
+        roles.add_role('editor', {'news.change_article'}, includes={'author'})
+        roles.add_role('reviewer', {'news.review_article'}, includes={'author'})
+        before = len(roles.published)
+        roles.remove_role('author')
+        published = roles.published[before:]
+        assert len(published) == 1
+        assert 'author' not in published[0]
+        assert published[0]['editor'] == {'news.change_article'}
+        assert published[0]['reviewer'] == {'news.review_article'}
+
+    def test_unknown_role(self):
+        with self.assertRaises(ValueError):
+            self.roles.add_role('admin', includes={'missing'})
+
+    def test_cycles(self):
+        with self.assertRaises(ValueError):
+            self.roles.add_role('reader', includes={'editor'})
+        with self.assertRaises(ValueError):
+            self.roles.add_role('reader', includes={'reader'})
+        # The hierarchy is unchanged.
+        assert self.roles.get_permissions('reader') == {'news.view_article'}
+
+
+class TestRoleHierarchyBackend(TestCase):
+
+    def test_backend(self):
+        roles = RoleHierarchy()
+        roles.add_role('reader', {'news.view_article'})
+        roles.add_role('editor', {'news.change_article'}, includes={'reader'})
+
+        class Backend(RoleHierarchyBackend):
+            hierarchy = roles
+
+            def get_user_roles(self, user_obj, obj=None):
+                return user_obj.roles
+
+        user = NonCallableMock(spec=[], is_active=True, roles=['editor'])
+        assert Backend().get_all_permissions(user) == {'news.view_article', 'news.change_article'}
+        assert Backend().has_perm(user, 'news.view_article') is True
+        assert Backend().has_perm(user, 'news.delete_article') is False
@@ -0,0 +1,78 @@
+from django.contrib.auth.models import Group
+from django.test import TestCase
+
+from mock_compat import Mock, NonCallableMock
+
+from auth_utils.rules import RuleBackend, RuleRegistry
+
+rules = RuleRegistry()
+
+
+@rules.rule('auth.view_group', filter=lambda user, queryset: queryset.filter(name__in=user.groups))
+def is_member(user, group):
+    return group is not None and group.name in user.groups
+
+
+@rules.rule('auth.change_group')
+def is_owner(user, group):
+    return group is not None and group.name == user.owns
+
+
+class GroupRulesBackend(RuleBackend):
+    rules = rules
+
+
+class TestRuleBackend(TestCase):
+    """
+    `RuleBackend`
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        Group.objects.bulk_create([Group(name=str(i)) for i in range(5)])
+
+    def setUp(self):
+        self.backend = GroupRulesBackend()
+        self.user = NonCallableMock(spec=[], is_active=True, groups={'1', '2'}, owns='2')
+        self.group = Group.objects.get(name='2')
+
+    def test_has_perm(self):
+        assert self.backend.has_perm(self.user, 'auth.view_group', self.group) is True
+        assert self.backend.has_perm(self.user, 'auth.change_group', self.group) is True
+        assert self.backend.has_perm(self.user, 'auth.delete_group', self.group) is False
+        assert self.backend.has_perm(self.user, 'auth.view_group') is False
+        self.user.is_active = False
+        assert self.backend.has_perm(self.user, 'auth.view_group', self.group) is False
+
+    def test_only_perm_rules(self):
+        """
+        `has_perm()` evaluates only the rules of the checked permission.
+        """
+        registry = RuleRegistry()
+        view, change = Mock(return_value=True), Mock(return_value=True)
+        registry.add_rule('auth.view_group', view)
+        registry.add_rule('auth.change_group', change)
+        backend = GroupRulesBackend()
+        backend.rules = registry
+        assert backend.has_perm(self.user, 'auth.view_group', self.group) is True
+        view.assert_called_once_with(self.user, self.group)
+        assert not change.called
+
+    def test_get_all_permissions(self):
+        assert self.backend.get_all_permissions(self.user, self.group) == {
+            'auth.view_group', 'auth.change_group',
+        }
+        assert self.backend.get_all_permissions(self.user, Group.objects.get(name='1')) == {
+            'auth.view_group',
+        }
+
+    def test_filter_queryset(self):
+        queryset = Group.objects.all()
+
+        def names(perm):
+            filtered = self.backend.filter_queryset(self.user, perm, queryset)
+            return sorted(filtered.values_list('name', flat=True))
+        with self.assertNumQueries(1):
+            assert names('auth.view_group') == ['1', '2']
+        assert names('auth.change_group') == ['2']
+        assert names('auth.delete_group') == []
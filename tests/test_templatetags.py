@@ -1,7 +1,13 @@
+import gc
+import weakref
 from unittest import TestCase
-from mock_compat import NonCallableMock
+from mock_compat import Mock, NonCallableMock
 
+from django.contrib.auth.models import AnonymousUser, User
 from django.template import Template, Context, TemplateSyntaxError
+from django.test import SimpleTestCase, override_settings
+
+from auth_utils.backends import BaseAuthorizationBackend
 
 
 class TestAuthUtils(TestCase):
@@ -23,7 +29,7 @@ class TestAuthUtils(TestCase):
                 perm == 'custom.change_foo' and obj is self.changeable,
                 perm == 'custom.delete_foo' and obj is self.deletable,
             ])
-        self.user = NonCallableMock(spec=[], has_perm=has_perm)
+        self.user = NonCallableMock(spec=[], has_perm=Mock(side_effect=has_perm))
 
     def _render(self, template_string):
         """
@@ -87,11 +93,333 @@ class TestAuthUtils(TestCase):
         self._assertCondition('user|can_delete:changeable', False)
         self._assertCondition('user|can_delete:deletable', True)
 
+    def test_can_view_can_add(self):
+        self._assertCondition('user|can_view:changeable', False)
+        self._assertCondition('user|can_add:changeable', False)
+        self.user.has_perm.side_effect = lambda perm, obj=None: perm in {
+            'custom.view_foo', 'custom.add_foo'}
+        self._assertCondition('user|can_view:deletable', True)
+        self._assertCondition('user|can_add:deletable', True)
+
     def test_can_change_can_delete_require_argument(self):
         """
         `can_change` and `can_delete` require an argument.
         """
-        for f in ['can_change', 'can_delete']:
+        for f in ['can_change', 'can_delete', 'can_view', 'can_add']:
             with self.assertRaises(TemplateSyntaxError) as cm:
                 self._render('{{ user|' + f + ' }}')
             assert str(cm.exception) == f + ' requires 2 arguments, 1 provided'
+
+    def test_results_memoized(self):
+        """
+        Each distinct permission question reaches `has_perm()` once.
+        """
+        self._render(
+            '{% if "custom.always" in user|perms:changeable %}{% endif %}'
+            '{% if "custom.always" in user|perms:changeable %}{% endif %}'
+            '{% if "custom.always" in user|perms:deletable %}{% endif %}'
+            '{% if user|can_change:changeable %}{% endif %}'
+            '{% if user|can_change:changeable %}{% endif %}'
+            '{% if "custom.change_foo" in user|perms:changeable %}{% endif %}'
+        )
+        assert self.user.has_perm.call_count == 3
+
+    def test_perms_lookups(self):
+        """
+        The `perms` checker supports lookups by app label and codename.
+        """
+        self.user.has_module_perms = Mock(side_effect=lambda app_label: app_label == 'custom')
+        assert self._render(
+            '{% with p=user|perms:changeable %}'
+            '{{ p.custom.change_foo }} {{ p.custom.delete_foo }} '
+            '{% if "delete_foo" in p.custom %}delete{% endif %}'
+            '{% if p.custom %}custom{% endif %}'
+            '{% if p.other %}other{% endif %}'
+            '{% endwith %}'
+        ) == 'True False custom'
+
+    def test_perms_checker_slots(self):
+        """
+        Checkers have no instance dictionary, and aren't iterable.
+        """
+        from auth_utils.templatetags.auth_utils import perms
+        checker = perms(self.user, self.changeable)
+        assert not hasattr(checker, '__dict__')
+        assert not hasattr(checker['custom'], '__dict__')
+        with self.assertRaises(TypeError):
+            list(checker)
+        with self.assertRaises(TypeError):
+            list(checker['custom'])
+
+    def test_perms_checker_not_retained(self):
+        """
+        Checkers (and so their objects) are not kept alive by the user object.
+        """
+        from auth_utils.templatetags.auth_utils import perms
+
+        class User(object):
+            def has_perm(self, perm, obj=None):
+                return True
+
+        class Row(object):
+            pk = 1
+        (user, row) = (User(), Row())
+        ref = weakref.ref(row)
+        assert 'custom.always' in perms(user, row)
+        del row
+        gc.collect()
+        assert ref() is None
+
+
+class PrefetchBackend(BaseAuthorizationBackend):
+    """
+    Grant 'custom.change_foo' on even-numbered objects, counting bulk lookups.
+    """
+    bulk_calls = []
+    single_calls = []
+
+    def get_user_permissions(self, user_obj, obj=None):
+        self.single_calls.append(obj)
+        return {'custom.change_foo'} if obj is not None and obj.number % 2 == 0 else set()
+
+    def get_user_permissions_bulk(self, user_obj, objs):
+        self.bulk_calls.append(len(objs))
+        return {obj: {'custom.change_foo'} if obj is not None and obj.number % 2 == 0 else set()
+                for obj in objs}
+
+
+class OwnerBackend(BaseAuthorizationBackend):
+    """
+    Grant 'custom.change_foo' on the objects the user owns, by overriding `has_perm()`.
+    """
+    bulk_calls = []
+
+    def has_perm(self, user_obj, perm, obj=None):
+        return perm == 'custom.change_foo' and getattr(obj, 'owner', None) is user_obj
+
+    def has_perm_bulk(self, user_obj, perm, objs):
+        self.bulk_calls.append((perm, len(objs)))
+        return super(OwnerBackend, self).has_perm_bulk(user_obj, perm, objs)
+
+
+@override_settings(AUTHENTICATION_BACKENDS=['test_templatetags.PrefetchBackend'])
+class TestPrefetchPerms(SimpleTestCase):
+    """
+    The `prefetch_perms` tag.
+    """
+
+    def setUp(self):
+        _meta = NonCallableMock(spec=[], app_label='custom', model_name='foo')
+        self.objs = [NonCallableMock(spec=[], _meta=_meta, number=i) for i in range(500)]
+        self.user = User()
+        del PrefetchBackend.bulk_calls[:]
+        del PrefetchBackend.single_calls[:]
+
+    def _render(self, template_string):
+        return Template('{% load auth_utils %}' + template_string).render(Context({
+            'user': self.user,
+            'objs': self.objs,
+        }))
+
+    def test_prefetch(self):
+        """
+        Rendering a table costs one bulk lookup, and no per-object checks.
+        """
+        output = self._render(
+            '{% prefetch_perms user objs "change" "delete" "custom.always" %}'
+            '{% for obj in objs %}'
+            '{% if user|can_change:obj %}c{% endif %}'
+            '{% if user|can_delete:obj %}d{% endif %}'
+            '{% if "custom.always" in user|perms:obj %}a{% endif %}'
+            '{% endfor %}'
+        )
+        assert output == 'c' * 250
+        assert PrefetchBackend.bulk_calls == [500]
+        assert PrefetchBackend.single_calls == []
+
+    def test_inactive_user(self):
+        """
+        Inactive users are denied without asking the backends, since they all deny them.
+        """
+        self.user.is_active = False
+        output = self._render(
+            '{% prefetch_perms user objs "change" %}'
+            '{{ user|can_change:objs.0 }}'
+            '{% if "custom.always" in user|perms:objs.0 %}a{% endif %}'
+        )
+        assert output == 'False'
+        assert PrefetchBackend.bulk_calls == []
+
+    @override_settings(AUTHENTICATION_BACKENDS=['test_templatetags.OwnerBackend'])
+    def test_overridden_has_perm(self):
+        """
+        Backends overriding `has_perm()` are asked `has_perm_bulk()` once per permission.
+        """
+        del OwnerBackend.bulk_calls[:]
+        self.objs[3].owner = self.user
+        output = self._render(
+            '{% prefetch_perms user objs "change" "delete" %}'
+            '{% for obj in objs %}'
+            '{% if user|can_change:obj %}c{{ obj.number }}{% endif %}'
+            '{% if user|can_delete:obj %}d{% endif %}'
+            '{% endfor %}'
+        )
+        assert output == 'c3'
+        assert sorted(OwnerBackend.bulk_calls) == [
+            ('custom.change_foo', 500), ('custom.delete_foo', 500)]
+
+    def test_user_override(self):
+        """
+        Users with their own permission checks are not prefetched, but asked.
+        """
+        class OwnUser(AnonymousUser):
+            is_active = True
+
+            def has_perm(self, perm, obj=None):
+                return obj is not None and obj.number == 1
+
+        self.user = OwnUser()
+        assert self._render('{% if user|can_change:objs.1 %}c{% endif %}') == 'c'
+        output = self._render(
+            '{% prefetch_perms user objs "change" %}'
+            '{% for obj in objs %}{% if user|can_change:obj %}c{{ obj.number }}{% endif %}'
+            '{% endfor %}'
+            '{% authblock user %}'
+            '{% for obj in objs %}{% if user|can_change:obj %}c{{ obj.number }}{% endif %}'
+            '{% endfor %}'
+            '{% endauthblock %}'
+        )
+        assert output == 'c1c1'
+        assert PrefetchBackend.bulk_calls == []
+
+    def test_inactive_user_override(self):
+        """
+        Inactive users with their own permission checks are asked, not denied.
+        """
+        class OwnUser(AnonymousUser):
+            is_active = False
+
+            def has_perm(self, perm, obj=None):
+                return True
+
+        self.user = OwnUser()
+        assert self._render('{% prefetch_perms user objs "change" %}'
+                            '{% if user|can_change:objs.0 %}c{% endif %}') == 'c'
+        assert PrefetchBackend.bulk_calls == []
+
+    def test_prefetch_skips_known(self):
+        """
+        Already-known results are not looked up again.
+        """
+        self._render('{% prefetch_perms user objs "change" %}'
+                     '{% prefetch_perms user objs "change" %}')
+        assert PrefetchBackend.bulk_calls == [500]
+
+
+@override_settings(AUTHENTICATION_BACKENDS=['test_templatetags.PrefetchBackend'])
+class TestAuthBlock(SimpleTestCase):
+    """
+    The `authblock` tag.
+    """
+
+    def setUp(self):
+        _meta = NonCallableMock(spec=[], app_label='custom', model_name='foo')
+        self.objs = [NonCallableMock(spec=[], _meta=_meta, number=i) for i in range(500)]
+        self.user = User()
+        del PrefetchBackend.bulk_calls[:]
+        del PrefetchBackend.single_calls[:]
+
+    def _render(self, template_string, **context):
+        context.setdefault('objs', self.objs)
+        return Template('{% load auth_utils %}' + template_string).render(Context(dict(
+            context, user=self.user,
+        )))
+
+    def test_loop(self):
+        """
+        The checks in loops are found and prefetched in one bulk lookup.
+        """
+        output = self._render(
+            '{% authblock user %}'
+            '{% for obj in objs %}'
+            '{% if user|can_change:obj %}c{% endif %}'
+            '{% if user|can_delete:obj %}d{% endif %}'
+            '{% if not "custom.always" in user|perms:obj %}{% else %}a{% endif %}'
+            '{{ user|can_view:obj|yesno:"v," }}'
+            '{% endfor %}'
+            '{% endauthblock %}'
+        )
+        assert output == 'c' * 250
+        assert PrefetchBackend.bulk_calls == [500]
+        assert PrefetchBackend.single_calls == []
+
+    def test_nested_loops(self):
+        output = self._render(
+            '{% authblock user %}'
+            '{% for group in groups %}{% for obj in group %}'
+            '{% if user|can_change:obj and 1 %}c{% endif %}'
+            '{% endfor %}{% endfor %}'
+            '{% endauthblock %}',
+            groups=[self.objs[:100], self.objs[100:]],
+        )
+        assert output == 'c' * 250
+        assert PrefetchBackend.bulk_calls == [500]
+        assert PrefetchBackend.single_calls == []
+
+    def test_iterator_loop(self):
+        """
+        Loops over generators are not prefetched, so they still render.
+        """
+        self.user.has_perm = Mock(side_effect=lambda perm, obj=None: obj.number % 2 == 0)
+        output = self._render(
+            '{% authblock user %}'
+            '{% for obj in objs %}[{{ obj.number }}{{ user|can_change:obj }}]{% endfor %}'
+            '{% endauthblock %}',
+            objs=(obj for obj in self.objs[:3]),
+        )
+        assert output == '[0True][1False][2True]'
+        assert PrefetchBackend.bulk_calls == []
+
+    def test_outside_loop(self):
+        output = self._render(
+            '{% authblock user %}'
+            '{% with can=user|can_change:obj %}{{ can }}{% endwith %}'
+            '{% if "custom.change_foo" in user|perms %}global{% endif %}'
+            '{% endauthblock %}',
+            obj=self.objs[0],
+        )
+        assert output == 'True'
+
+    def test_unanalyzed(self):
+        """
+        Checks that can't be found in advance fall back to `has_perm()`.
+        """
+        self.user.has_perm = Mock(return_value=False)
+        output = self._render(
+            '{% authblock user %}'
+            '{% for obj in objs %}{% if perm in user|perms:obj %}x{% endif %}{% endfor %}'
+            '{% if other_user|can_change:objs.0 %}x{% endif %}'
+            '{% endauthblock %}',
+            perm='custom.change_foo',
+            other_user=self.user,
+        )
+        assert output == ''
+        assert self.user.has_perm.call_count == 500
+        assert PrefetchBackend.bulk_calls == []
+
+    def test_missing_user(self):
+        """
+        A user variable that doesn't resolve to a user skips prefetching.
+        """
+        assert self._render(
+            '{% authblock missing %}'
+            '{% for obj in objs %}{% if 0 and missing|can_change:obj %}c{% endif %}{% endfor %}'
+            '{% endauthblock %}'
+            '{% prefetch_perms missing objs "change" %}'
+            '{% authblock missing %}ok{% endauthblock %}'
+        ) == 'ok'
+        assert PrefetchBackend.bulk_calls == []
+
+    def test_syntax(self):
+        with self.assertRaises(TemplateSyntaxError):
+            self._render('{% authblock %}{% endauthblock %}')
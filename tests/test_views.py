@@ -1,10 +1,10 @@
-from unittest import TestCase
-
 from mock_compat import NonCallableMock
 
-from django.contrib.auth.models import AnonymousUser
-from django.test import RequestFactory
-from django.views.generic import View
+from django.contrib.auth.models import AnonymousUser, Group, User
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.views.generic import DetailView, View
 
 from auth_utils.views import ObjectPermissionRequiredMixin
 
@@ -26,7 +26,7 @@ class PermissionView(ObjectPermissionRequiredMixin, View):
         return 'Permitted!'
 
 
-class TestObjectPermissionRequiredMixin(TestCase):
+class TestObjectPermissionRequiredMixin(SimpleTestCase):
     """
     Test `ObjectPermissionRequiredMixin` via PermissionView.
 
@@ -63,3 +63,96 @@ class TestObjectPermissionRequiredMixin(TestCase):
     def test_denied_user(self):
         self.request.user = self.denied_user
         self._assertNotPermitted(self.view(self.request))
+
+    def test_missing_permission(self):
+        self.request.user = self.permitted_user
+        view = PermissionView.as_view(permission_required=['custom.always', 'custom.no_object'],
+                                      raise_exception=True)
+        with self.assertRaises(PermissionDenied):
+            view(self.request)
+
+    def test_require_any(self):
+        self.request.user = self.permitted_user
+        view = PermissionView.as_view(permission_required=['custom.always', 'custom.no_object'],
+                                      permission_require_all=False)
+        self._assertPermitted(view(self.request))
+
+
+class GroupBackend(object):
+    """
+    Stub authorization backend: grant all permissions on groups.
+    """
+
+    def has_perm(self, user_obj, perm, obj=None):
+        return isinstance(obj, Group)
+
+
+class SuspendedUser(AnonymousUser):
+    """
+    A user class with its own, restrictive permission check.
+    """
+    is_active = True
+
+    def has_perm(self, perm, obj=None):
+        return False
+
+
+class GroupDetail(ObjectPermissionRequiredMixin, DetailView):
+    """
+    Object-permission-protected detail view of a real model.
+    """
+    model = Group
+    permission_required = ['auth.view_group']
+
+    def render_to_response(self, context, **response_kwargs):
+        return HttpResponse(context['object'].name)
+
+
+@override_settings(AUTHENTICATION_BACKENDS=['test_views.GroupBackend'])
+class TestObjectFetchedOnce(TestCase):
+    """
+    `ObjectPermissionRequiredMixin` fetches the object once per request.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.group = Group.objects.create(name='group')
+
+    def test_one_query(self):
+        request = RequestFactory().get('/')
+        request.user = User()
+        with self.assertNumQueries(1):
+            response = GroupDetail.as_view()(request, pk=self.group.pk)
+        assert response.content == b'group'
+
+    def test_user_override(self):
+        """
+        A user class overriding `has_perm()` decides, rather than the backends.
+        """
+        request = RequestFactory().get('/')
+        request.user = SuspendedUser()
+        with self.assertRaises(PermissionDenied):
+            GroupDetail.as_view(raise_exception=True)(request, pk=self.group.pk)
+
+    @override_settings(AUTHENTICATION_BACKENDS=['django.contrib.auth.backends.ModelBackend'])
+    def test_anonymous_not_fetched(self):
+        """
+        Anonymous users are denied without fetching the object, if all backends deny them.
+        """
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        with self.assertNumQueries(0):
+            with self.assertRaises(PermissionDenied):
+                GroupDetail.as_view(raise_exception=True)(request, pk=self.group.pk)
+
+    def test_explicit_queryset(self):
+        """
+        `get_object()` with an explicit queryset still queries.
+        """
+        view = GroupDetail()
+        view.kwargs = {'pk': self.group.pk}
+        assert view.get_object() == self.group
+        with self.assertNumQueries(1):
+            assert view.get_object(Group.objects.all()) == self.group
+        with self.assertNumQueries(0):
+            assert view.get_object() is view.object